@@ -1,20 +1,382 @@
-from flask import Flask, render_template, request, redirect, url_for
-from detector import analyze
+from flask import Flask, render_template, stream_template, request, redirect, url_for, jsonify, g, Response, abort
+from detector import analyze, llm_analyze_openai, llm_enabled, REPORT_CACHE, LLM_CACHE, TIMINGS_ENABLED, HIGH_RISK_SCORE
+from detectors import BUILTIN, DETECTORS, UnknownDetector, plan
+from jobs import JobStore, JobQueueFull
+from ingest import analyze_mapped
+from incremental import IncrementalAnalyzer
+from pages import DocumentStore
+from markupsafe import Markup
+from metrics import REGISTRY, REQUEST_SECONDS, REQUESTS, Timings, timed
+import cProfile
+import functools
+import jsonapi
 import os
+import redact
+import tempfile
+import time
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("CADRA_MAX_UPLOAD_MB", "1024")) << 20
+# Pasted text is parsed into memory, so it gets a much smaller limit than
+# file uploads, which are spooled to disk.
+MAX_TEXT_BYTES = int(os.getenv("CADRA_MAX_TEXT_KB", "2048")) << 10
+# Callable used for background LLM enrichment (None disables it); tests can
+# swap in a local fake backend.
+app.config["LLM_BACKEND"] = llm_analyze_openai if llm_enabled() else None
+
+JOBS = JobStore(
+    max_workers=int(os.getenv("CADRA_LLM_WORKERS", "4")),
+    max_pending=int(os.getenv("CADRA_LLM_MAX_PENDING", "64")),
+    path=os.getenv("CADRA_JOBS_PATH")
+)
+
+# Paragraph states of the documents most recently analyzed with a doc_id.
+INCREMENTAL = IncrementalAnalyzer(max_documents=int(os.getenv("CADRA_INCREMENTAL_DOCS", "256")))
+
+# Analyzed documents, shown on the result page one page at a time.
+DOCUMENTS = DocumentStore(os.getenv("CADRA_DOCS_DIR"), ttl=int(os.getenv("CADRA_DOCS_TTL", "3600")),
+                          max_bytes=int(os.getenv("CADRA_DOCS_MAX_MB", "256")) << 20,
+                          max_document_bytes=int(os.getenv("CADRA_DOCS_MAX_DOC_MB", "8")) << 20)
+# Pasted documents longer than this get the streamed, paged result page.
+STREAM_MIN_CHARS = int(os.getenv("CADRA_STREAM_RESULT_KB", "64")) << 10
+# Marks the points where a streamed page sends what it has rendered so far.
+FLUSH = Markup("<!--flush-->")
+STREAM_BUFFER = 16 << 10
+
+# With CADRA_PROFILE_DIR set, every request runs under cProfile and the
+# stats of those slower than CADRA_PROFILE_THRESHOLD_MS are dumped there.
+PROFILE_DIR = os.getenv("CADRA_PROFILE_DIR")
+PROFILE_THRESHOLD = float(os.getenv("CADRA_PROFILE_THRESHOLD_MS", "500")) / 1000
+
+@REGISTRY.collector
+def _cache_metrics():
+    caches = {"report": REPORT_CACHE.stats(), "llm": LLM_CACHE.stats()}
+    return [
+        (f"cadra_cache_{key}_total", "counter", f"Result cache {key.replace('_', ' ')}.",
+         [({"cache": name}, st[key]) for name, st in caches.items()])
+        for key in ("hits", "disk_hits", "misses", "evictions")
+    ]
+
+@app.before_request
+def _start_request():
+    g.started = time.perf_counter()
+    g.timings = Timings() if TIMINGS_ENABLED else None
+    g.profiler = None
+    if PROFILE_DIR:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def _finish_request(response):
+    end = functools.partial(_end_request, request.endpoint or "unknown", response.status_code,
+                            g.started, g.profiler)
+    g.ended = True
+    if response.is_streamed:
+        # The body is rendered while it is sent: stop the clock and the
+        # profiler once the server has finished (or abandoned) it.
+        response.call_on_close(end)
+    else:
+        end()
+    return response
+
+@app.teardown_request
+def _teardown_request(exc):
+    # A view that raised may skip after_request; still record the request
+    # and, above all, switch its profiler off.
+    if "started" in g and not g.get("ended"):
+        _end_request(request.endpoint or "unknown", 500, g.started, g.profiler)
+
+def _end_request(endpoint, status, started, profiler):
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.observe(elapsed, endpoint)
+    REQUESTS.inc(1, endpoint, status)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed >= PROFILE_THRESHOLD:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = f"{endpoint}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.prof"
+            profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+
+def _run_llm(backend, text):
+    # Background jobs have no request Timings; record the stage in the
+    # process-wide metrics only.
+    with Timings().stage("llm"):
+        return backend(text)
 
 @app.route("/", methods=["GET"])
 def index():
     return render_template("index.html")
 
+def _plan(detectors, doc_id):
+    """
+    The detectors to run. Revisions of a document (doc_id) are combined
+    from paragraph results, which only the built-in detectors have.
+    Raises UnknownDetector.
+    """
+    if not doc_id:
+        return plan(detectors)
+    planned = plan(detectors or BUILTIN)
+    if any(d.name not in BUILTIN for d in planned):
+        raise UnknownDetector("with doc_id, detectors must be among: " + ", ".join(BUILTIN))
+    return planned
+
+def _heuristic_report(text, doc_id=None, detectors=None, triage=None):
+    """
+    The report without the LLM section, plus the backend that should fill
+    it in (None when no LLM is configured, or when triage exited early).
+    Raises UnknownDetector.
+    """
+    backend = app.config["LLM_BACKEND"]
+    planned = _plan(detectors, doc_id)
+    if not doc_id:
+        report = analyze(text, llm=False, timings=g.timings or False, detectors=detectors, triage=triage)
+        if triage is not None and report["triage"]["early_exit"] and backend is not None:
+            report["triage"]["skipped"].append("llm")
+            backend = None
+        return report, backend
+    # A revision of a known document: only changed paragraphs are
+    # rescanned, and only new flagged paragraphs go to the LLM.
+    with timed(g.timings, "incremental"):
+        rev = INCREMENTAL.update(doc_id, text)
+        report = rev.report(detectors=planned)
+    if g.timings is not None:
+        report["timings"] = g.timings.as_dict()
+    if backend is llm_analyze_openai:
+        backend = lambda _text: rev.llm()
+    return report, backend
+
 @app.route("/analyze", methods=["POST"])
 def run_analyze():
+    if (request.content_length or 0) > MAX_TEXT_BYTES:
+        abort(413)
     text = request.form.get("doc_text", "").strip()
     if not text:
         return redirect(url_for("index"))
-    report = analyze(text)
-    return render_template("result.html", text=text, report=report)
+    doc_id = request.form.get("doc_id", "").strip()
+    detectors = request.values.get("detectors")
+    try:
+        if len(text) > STREAM_MIN_CHARS:
+            # Checked up front: once streaming starts, the status is sent.
+            _plan(detectors, doc_id)
+            return _streamed_result(text, doc_id, detectors)
+        report, backend = _heuristic_report(text, doc_id, detectors)
+    except UnknownDetector as e:
+        return jsonify({"error": str(e), "available": list(DETECTORS)}), 400
+    job_id = _submit_llm(report, backend, text)
+    with timed(g.timings, "render"):
+        return render_template("result.html", text=text, report=report, job_id=job_id)
+
+def _submit_llm(report, backend, text):
+    if backend is None:
+        return None
+    try:
+        return JOBS.submit(_run_llm, backend, text)
+    except JobQueueFull:
+        report["llm"] = {"error": "LLM service is busy; showing heuristic results only."}
+        return None
+
+def _coalesce(chunks):
+    # Jinja yields a string per template node; send them in larger writes,
+    # except that FLUSH sends what is buffered at once.
+    buf = []
+    size = 0
+    for chunk in chunks:
+        if FLUSH in chunk:
+            buf.append(chunk.replace(FLUSH, ""))
+            yield "".join(buf)
+            buf = []
+            size = 0
+            continue
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_BUFFER:
+            yield "".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield "".join(buf)
+
+def _streamed_result(text, doc_id, detectors):
+    """
+    The result page as a stream: the page head goes out before the
+    analysis runs, then the report, then the first page of the document;
+    the other pages are fetched on demand.
+    """
+    key = DOCUMENTS.put(text)
+
+    def analysis():
+        report, backend = _heuristic_report(text, doc_id, detectors)
+        return report, _submit_llm(report, backend, text)
+
+    chunks = stream_template("result.html", analysis=analysis, page=DOCUMENTS.page(key, 0), flush=FLUSH)
+    timings = g.timings
+
+    def render():
+        with timed(timings, "render"):
+            yield from _coalesce(chunks)
+
+    return Response(render(), mimetype="text/html")
+
+def _api_response(obj, status=200, fields=None):
+    with timed(g.timings, "serialize"):
+        body, encoding = jsonapi.encode(jsonapi.dumps(jsonapi.project(obj, fields)),
+                                        request.headers.get("Accept-Encoding"))
+    response = Response(body, status, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+def _api_error(status, message, **extra):
+    return _api_response(dict(error=message, **extra), status)
+
+@app.route("/api/v1/analyze", methods=["POST"])
+def api_analyze():
+    """
+    Analyzes a JSON body {"text": ..., options} or a raw text body. The
+    options, also accepted as query parameters: detectors, doc_id,
+    fields (projection, see jsonapi.project), llm (off, sync or async) and
+    triage (a score threshold, or "high"; see detector.analyze).
+    The report comes back as JSON; it does not echo the text.
+    """
+    if (request.content_length or 0) > MAX_TEXT_BYTES:
+        return _api_error(413, "document too large", limit_bytes=MAX_TEXT_BYTES)
+    params = request.args.to_dict()
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+            return _api_error(400, 'expected a JSON object with a "text" string')
+        params.update(body)
+        text = body["text"]
+    else:
+        text = request.get_data(as_text=True)
+    text = text.strip()
+    if not text:
+        return _api_error(400, "empty document")
+    for key in ("detectors", "fields"):
+        value = params.get(key)
+        if not (value is None or isinstance(value, str)
+                or isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            return _api_error(400, f"{key} must be a string or a list of strings")
+    fields = params.get("fields")
+    if isinstance(fields, list):
+        fields = ",".join(fields)
+    mode = str(params.get("llm", "off")).lower()
+    mode = {"true": "sync", "1": "sync", "false": "off", "0": "off"}.get(mode, mode)
+    if mode not in ("off", "sync", "async"):
+        return _api_error(400, "llm must be off, sync or async")
+    doc_id = params.get("doc_id") or ""
+    if not isinstance(doc_id, str):
+        return _api_error(400, "doc_id must be a string")
+    doc_id = doc_id.strip()
+    triage = params.get("triage")
+    if triage is not None:
+        if isinstance(triage, str) and triage.strip().lower() == "high":
+            triage = HIGH_RISK_SCORE
+        elif isinstance(triage, str) and triage.strip().isascii() and triage.strip().isdigit():
+            triage = int(triage)
+        elif type(triage) is not int:
+            # Floats, booleans and the like would be silently truncated.
+            return _api_error(400, 'triage must be an integer score threshold or "high"')
+        if doc_id:
+            return _api_error(400, "triage cannot be combined with doc_id")
+    try:
+        report, backend = _heuristic_report(text, doc_id, params.get("detectors"), triage)
+    except UnknownDetector as e:
+        return _api_error(400, str(e), available=list(DETECTORS))
+    if backend is not None and mode == "sync":
+        with timed(g.timings, "llm"):
+            report["llm"] = backend(text)
+    elif backend is not None and mode == "async":
+        try:
+            job_id = JOBS.submit(_run_llm, backend, text)
+        except JobQueueFull:
+            return _api_error(503, "LLM service is busy", report=report)
+        report["job"] = {"id": job_id, "url": url_for("job_status", job_id=job_id)}
+    return _api_response(report, fields=fields)
+
+@app.route("/api/v1/redact", methods=["POST"])
+def api_redact():
+    """
+    Returns the document with PII masked, as text/plain. Takes the same
+    body forms as /api/v1/analyze; options: types and masks (see redact.py).
+    """
+    if (request.content_length or 0) > MAX_TEXT_BYTES:
+        return _api_error(413, "document too large", limit_bytes=MAX_TEXT_BYTES)
+    params = request.args.to_dict()
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+            return _api_error(400, 'expected a JSON object with a "text" string')
+        params.update(body)
+        text = body["text"]
+    else:
+        text = request.get_data(as_text=True)
+    try:
+        with timed(g.timings, "redact"):
+            out = redact.redact(text, params.get("masks"), params.get("types"))
+    except ValueError as e:
+        return _api_error(400, str(e), types=list(redact.LABELS))
+    body, encoding = jsonapi.encode(out.encode("utf-8", "surrogatepass"), request.headers.get("Accept-Encoding"))
+    response = Response(body, mimetype="text/plain")
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+@app.route("/analyze/file", methods=["POST"])
+def run_analyze_file():
+    upload = request.files.get("doc_file")
+    if upload is None or not upload.filename:
+        return redirect(url_for("index"))
+    # Spool the upload to disk in chunks and scan it through a memory map,
+    # so the document is never held in memory as one string.
+    fd, path = tempfile.mkstemp(prefix="cadra-", suffix=".upload")
+    key = None
+    try:
+        with os.fdopen(fd, "wb") as f:
+            upload.save(f)
+        size = os.path.getsize(path)
+        with timed(g.timings, "analyze_mapped"):
+            report = analyze_mapped(path)
+        # The spooled file (or its start) becomes the paged document view.
+        key = DOCUMENTS.adopt(path)
+    finally:
+        if key is None:
+            os.unlink(path)
+    if g.timings is not None:
+        report["timings"] = g.timings.as_dict()
+    with timed(g.timings, "render"):
+        return render_template("result.html", text=None, report=report, job_id=None,
+                               filename=upload.filename, size=size, shown=DOCUMENTS.size(key),
+                               page=DOCUMENTS.page(key, 0))
+
+@app.route("/documents/<key>/pages/<int:number>", methods=["GET"])
+def document_page(key, number):
+    try:
+        page = DOCUMENTS.page(key, number)
+    except KeyError:
+        page = None
+    if page is None:
+        abort(404)
+    return render_template("page.html", page=page)
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown or expired job"}), 404
+    return jsonify(job)
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"report": REPORT_CACHE.stats(), "llm": LLM_CACHE.stats()})
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development server only; see wsgi.py and gunicorn.conf.py for production.
+    app.run(host=os.getenv("CADRA_HOST", "127.0.0.1"), port=int(os.getenv("CADRA_PORT", "5000")),
+            debug=os.getenv("CADRA_DEBUG", "1") == "1")
@@ -0,0 +1,209 @@
+"""
+Batch analysis over a process pool.
+
+    python batch.py INPUT [-o out.jsonl] [--workers N] [--chunksize N]
+
+INPUT is a directory (scanned recursively), a glob pattern, or a .jsonl
+file with one {"id": ..., "text": ...} object per line. Results are written
+as JSONL, one {"id": ..., "report": ...} line per document, in input order
+and as soon as each chunk finishes.
+
+Only the heuristic detectors run here; the LLM stage is skipped.
+--summary corpus.json also writes corpus statistics (score and signal
+percentiles, risk level counts, top offenders; see corpus.py, needs numpy).
+--detectors pii,tone limits in-memory documents to those detectors; files
+large enough to be streamed always get every built-in section. Stateful
+detectors (--detectors ...,similar) run in this process, in input order,
+so every document is checked against one index under its own id.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from compact import CompactReport, pack
+from detector import analyze, run_stateful
+from detectors import UnknownDetector, parse, plan, split
+from stream import analyze_file
+
+DEFAULT_CHUNKSIZE = 64
+# Files above this size are analyzed in streaming mode with bounded memory.
+STREAM_THRESHOLD = 32 << 20
+
+
+def _read(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _analyze_chunk(chunk, detectors=None, compact=False):
+    # Runs in the worker. Items carry either the text or a path to read, so
+    # file contents never travel through the parent process.
+    out = []
+    for doc_id, text, path in chunk:
+        if text is None and os.path.getsize(path) > STREAM_THRESHOLD:
+            report = analyze_file(path)
+        else:
+            if text is None:
+                text = _read(path)
+            report = analyze(text, llm=False, cache=False, detectors=detectors, stateful=False)
+        out.append((doc_id, pack(report) if compact else report))
+    return out
+
+
+def _add_stateful(chunk, results, stateful):
+    # Runs in the parent, chunk by chunk in input order. Streamed files keep
+    # only the built-in sections, as documented above.
+    for (doc_id, text, path), (_, report) in zip(chunk, results):
+        if text is None and os.path.getsize(path) > STREAM_THRESHOLD:
+            yield doc_id, report
+            continue
+        if text is None:
+            text = _read(path)
+        yield doc_id, run_stateful(report, text, stateful, doc_id)
+
+
+def _items(docs):
+    for i, doc in enumerate(docs):
+        if isinstance(doc, str):
+            yield i, doc, None
+        else:
+            doc_id, text = doc
+            yield doc_id, text, None
+
+
+def _chunks(items, size):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run(items, workers=None, chunksize=DEFAULT_CHUNKSIZE, detectors=None, compact=False):
+    workers = workers or os.cpu_count() or 1
+    stateful = split(plan(detectors))[1]
+    # With stateful detectors, reports are packed only once their sections
+    # are in.
+    work = partial(_analyze_chunk, detectors=detectors, compact=compact and not stateful)
+    for chunk, results in _chunk_results(_chunks(items, chunksize), work, workers):
+        if stateful:
+            results = ((doc_id, pack(report) if compact else report)
+                       for doc_id, report in _add_stateful(chunk, results, stateful))
+        yield from results
+
+
+def _chunk_results(chunks, work, workers):
+    if workers == 1:
+        for chunk in chunks:
+            yield chunk, work(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded window of chunks in flight so huge inputs are never
+        # queued (or read) all at once.
+        inflight = deque()
+        for chunk in chunks:
+            inflight.append((chunk, pool.submit(work, chunk)))
+            if len(inflight) >= workers * 2:
+                chunk, future = inflight.popleft()
+                yield chunk, future.result()
+        while inflight:
+            chunk, future = inflight.popleft()
+            yield chunk, future.result()
+
+
+def analyze_batch(docs, workers=None, chunksize=DEFAULT_CHUNKSIZE, detectors=None, compact=False):
+    """
+    Analyzes an iterable of documents across a process pool.
+
+    docs: strings, or (id, text) pairs. Plain strings get their position as
+    id. Yields (id, report) in input order; workers=1 runs in-process.
+    detectors: names to run instead of the default detectors.
+    compact: yield compact.CompactReport objects (packed in the workers)
+    instead of dicts, for callers that keep many reports in memory.
+    """
+    results = _run(_items(docs), workers, chunksize, parse(detectors), compact)
+    if not compact:
+        return results
+    return ((doc_id, CompactReport(data)) for doc_id, data in results)
+
+
+def iter_source(source, id_field="id", text_field="text"):
+    """
+    Expands a directory, glob or JSONL path into (id, text, path) items.
+    JSONL lines that are not an object, or whose text is not a string,
+    are skipped with a warning on stderr giving their line number.
+    """
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                yield path, None, path
+    elif source.endswith(".jsonl") and os.path.isfile(source):
+        with open(source, encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                if not line.strip():
+                    continue
+                obj = json.loads(line)
+                if not isinstance(obj, dict):
+                    print(f"{source}:{n + 1}: skipped, not a JSON object", file=sys.stderr)
+                    continue
+                text = obj.get(text_field)
+                if text is not None and not isinstance(text, str):
+                    print(f"{source}:{n + 1}: skipped, {text_field!r} is not a string", file=sys.stderr)
+                    continue
+                yield obj.get(id_field, n), text or "", None
+    else:
+        for path in sorted(glob.iglob(source, recursive=True)):
+            if os.path.isfile(path):
+                yield path, None, path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many documents and write JSONL reports.")
+    parser.add_argument("source", help="directory, glob pattern or .jsonl file")
+    parser.add_argument("-o", "--output", help="output JSONL file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="documents per dispatched chunk")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--detectors", help="comma list of detectors to run (default: all but similar)")
+    parser.add_argument("--summary", help="write corpus statistics JSON here (needs numpy)")
+    parser.add_argument("--top", type=int, default=20, help="top offending documents in --summary")
+    args = parser.parse_args(argv)
+    try:
+        detectors = parse(args.detectors)
+    except UnknownDetector as e:
+        parser.error(str(e))
+    cols = None
+    if args.summary:
+        try:
+            import corpus
+        except ImportError as e:
+            parser.error(f"--summary needs numpy ({e})")
+        cols = corpus.Columns()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        items = iter_source(args.source, args.id_field, args.text_field)
+        for doc_id, report in _run(items, args.workers, args.chunksize, detectors):
+            out.write(json.dumps({"id": doc_id, "report": report}, separators=(",", ":")))
+            out.write("\n")
+            if cols is not None:
+                cols.append(doc_id, report)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if cols is not None:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(corpus.summarize(cols, args.top), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
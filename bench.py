@@ -0,0 +1,444 @@
+"""
+Benchmarks for the detector functions on a seeded synthetic corpus.
+
+    python bench.py                          # default sizes, prints a table
+    python bench.py --sizes 1KB,1MB,100MB -o bench.json
+    python bench.py -o new.json --baseline bench.json
+    python bench.py --pathological --sizes 100KB,1MB
+    python bench.py --import-time
+    python bench.py --reports 5000
+
+For every (target, size) pair this reports throughput (MB/s of input),
+latency percentiles over the repeats and peak traced memory. Results are
+written as JSON; with --baseline, throughput is compared per pair and the
+exit status is 1 if any pair regressed by more than --tolerance.
+
+--pathological instead times the sensitive-item detectors on adversarial
+inputs built to make backtracking regexes go quadratic, and exits 1 if any
+of them needs more than --max-ms-per-mb.
+
+--import-time imports each of IMPORT_MODULES in fresh interpreters (with
+no LLM, cache or job file configured) and reports the median import time.
+It exits 1 if one takes more than --max-import-ms (app, which loads
+Flask: --max-app-import-ms) or loads any of LAZY_MODULES, which only LLM
+calls, cache and job files and background jobs need.
+
+--reports N analyzes N small documents and compares holding and
+(de)serializing their reports as dicts, JSON text and compact.py packed
+reports: traced memory per report, encoded size and per-report time.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import compact
+import detector
+
+VOCAB = (
+    "the a report result data team project meeting review update customer account "
+    "service order payment invoice policy system user access request issue change "
+    "plan schedule budget quarter analysis summary document process approval note "
+    "is are was will should could can must may has have had been being shows "
+    "please thanks regarding attached following previous current new final "
+    "quickly carefully today tomorrow yesterday soon later before after during"
+).split()
+TEMPLATES = [
+    "this report discusses", "in conclusion", "the results show that",
+    "for more information", "please contact us",
+]
+SUSPICIOUS = ["send money", "click here", "login", "password", "bank", "pay now", "upi"]
+TOXIC = ["stupid", "idiot", "dumb", "hate", "worthless", "shut up"]
+
+TARGETS = {
+    "find_sensitive_items": detector.find_sensitive_items,
+    "simple_tone_and_toxicity": detector.simple_tone_and_toxicity,
+    "structure_and_clarity": detector.structure_and_clarity,
+    "plagiarism_hint": detector.plagiarism_hint,
+    "analyze": lambda text: detector.analyze(text, llm=False, cache=False),
+    "analyze_triage": lambda text: detector.analyze(text, llm=False, cache=False, triage=True),
+}
+
+# Adversarial inputs for the sensitive-item patterns: long runs of the
+# characters their quantifiers repeat over, built to fail as late as
+# possible. The digit and www. patterns in detector.py begin with a literal
+# backspace byte (\x08, see pii.py), so the *_anchored inputs carry one
+# wherever an attempt should start. Without it those patterns fail on the
+# first character.
+PATHOLOGICAL = {
+    "email_local_run": lambda n: "a" * (n - 1) + "@",
+    "email_domain_run": lambda n: "@" + "b" * (n - 1),
+    "email_dense_at": lambda n: ("a@" * n)[:n],
+    "email_dots": lambda n: ("a@b" + "." * n)[:n],
+    "digit_run": lambda n: "1" * n,
+    "digit_run_anchored": lambda n: ("\x08" + "1" * n)[:n],
+    "digit_space_run": lambda n: ("1111 " * n)[:n],
+    # RE_AADHAAR's \d{4}\s*\d{4}\s*\d{4}: whitespace runs after each group,
+    # and groups one digit short.
+    "aadhaar_spaces_anchored": lambda n: ("\x081111" + " " * n)[:n],
+    "aadhaar_inner_spaces_anchored": lambda n: ("\x0811111111" + " " * n)[:n],
+    "aadhaar_short_groups_anchored": lambda n: ("\x081111 \t1111\n 111" * n)[:n],
+    "dotted_digits_anchored": lambda n: ("\x081.1.1." * n)[:n],
+    "url_tail": lambda n: ("http://" + "a" * n)[:n],
+    "url_prefixes": lambda n: ("http" * n)[:n],
+    # RE_PHONE's (?:\+?91[\-\s]?)?[6-9]\d{9}: the optional prefix with one
+    # digit too few or too many, and grouped numbers one digit short.
+    "phone_prefix_short_anchored": lambda n: ("\x08+91-987654321" * n)[:n],
+    "phone_prefix_long_anchored": lambda n: ("\x0891 98765432109" * n)[:n],
+    "phone_groups_anchored": lambda n: ("\x08123-456-789" * n)[:n],
+}
+
+UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+
+
+def parse_size(s):
+    s = s.strip().upper()
+    for unit, mult in UNITS.items():
+        if s.endswith(unit):
+            return int(float(s[:-len(unit)]) * mult)
+    return int(s)
+
+
+def _pii(rng):
+    kind = rng.randrange(5)
+    if kind == 0:
+        return f"{rng.choice(VOCAB)}.{rng.choice(VOCAB)}{rng.randrange(100)}@example.com"
+    if kind == 1:
+        return f"+91 {rng.randrange(6, 10)}{rng.randrange(10**8, 10**9)}"
+    if kind == 2:
+        return f"{rng.randrange(1000, 10000)} {rng.randrange(1000, 10000)} {rng.randrange(1000, 10000)}"
+    if kind == 3:
+        return ".".join(str(rng.randrange(256)) for _ in range(4))
+    return f"https://www.example.com/{rng.choice(VOCAB)}/{rng.randrange(10**6)}"
+
+
+def generate_document(size, seed=0, pii_density=0.05, toxicity=0.02, sentence_len=18):
+    """
+    Returns roughly `size` characters of English-like text.
+
+    pii_density: chance per sentence of an email/phone/Aadhaar/IP/URL.
+    toxicity: chance per sentence of a toxic word, and separately of a
+    suspicious phrase.
+    sentence_len: mean words per sentence.
+    """
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        n = max(3, int(rng.gauss(sentence_len, sentence_len / 3)))
+        words = rng.choices(VOCAB, k=n)
+        if rng.random() < 0.05:
+            words.insert(0, rng.choice(TEMPLATES))
+        if rng.random() < pii_density:
+            words.insert(rng.randrange(len(words)), _pii(rng))
+        if rng.random() < toxicity:
+            words.insert(rng.randrange(len(words)), rng.choice(TOXIC))
+        if rng.random() < toxicity:
+            words.insert(rng.randrange(len(words)), rng.choice(SUSPICIOUS))
+        if rng.random() < 0.02:
+            words.append(rng.choice(VOCAB).upper())
+        sentence = " ".join(words)
+        sentence = sentence[0].upper() + sentence[1:] + rng.choice("....!?")
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(parts)[:size]
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(q / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def measure(fn, text, repeats):
+    fn(text)  # warm-up
+    times = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn(text)
+        times.append(time.perf_counter() - t)
+    times.sort()
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mb = len(text.encode("utf-8")) / (1 << 20)
+    p50 = _percentile(times, 50)
+    return {
+        "bytes": len(text.encode("utf-8")),
+        "repeats": repeats,
+        "p50_ms": round(p50 * 1000, 3),
+        "p90_ms": round(_percentile(times, 90) * 1000, 3),
+        "p99_ms": round(_percentile(times, 99) * 1000, 3),
+        "max_ms": round(times[-1] * 1000, 3),
+        "mb_per_s": round(mb / p50, 3) if p50 else None,
+        "peak_mem_mb": round(peak / (1 << 20), 3),
+    }
+
+
+def run(sizes, targets, seed=0, pii_density=0.05, toxicity=0.02, sentence_len=18,
+        repeats=None, time_budget=2.0):
+    """
+    Benchmarks every target on a document of every size. Without explicit
+    repeats, each pair gets as many runs as fit in time_budget seconds
+    (at least 3, at most 50).
+    """
+    results = []
+    for size in sizes:
+        text = generate_document(size, seed, pii_density, toxicity, sentence_len)
+        for name in targets:
+            fn = TARGETS[name]
+            n = repeats
+            if n is None:
+                t = time.perf_counter()
+                fn(text)
+                once = time.perf_counter() - t
+                n = max(3, min(50, int(time_budget / once) if once else 50))
+            r = measure(fn, text, n)
+            r.update({"target": name, "size": size})
+            results.append(r)
+            print(f"{name:26} {size:>11,} B  {r['mb_per_s'] or 0:9.2f} MB/s  "
+                  f"p50 {r['p50_ms']:10.2f} ms  p99 {r['p99_ms']:10.2f} ms  "
+                  f"peak {r['peak_mem_mb']:9.2f} MB", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "pii_density": pii_density,
+            "toxicity": toxicity,
+            "sentence_len": sentence_len,
+        },
+        "results": results,
+    }
+
+
+def run_pathological(sizes, names, max_ms_per_mb):
+    """
+    Times SCANNER.sensitive_matches on every adversarial input and size.
+    Returns (results, failures); a failure is a (name, size, ms_per_mb)
+    over the budget.
+    """
+    results = []
+    failures = []
+    for size in sizes:
+        for name in names:
+            text = PATHOLOGICAL[name](size)
+            r = measure(detector.SCANNER.sensitive_matches, text, 3)
+            ms_per_mb = round(r["max_ms"] / (r["bytes"] / (1 << 20)), 3)
+            r.update({"target": name, "size": size, "ms_per_mb": ms_per_mb})
+            results.append(r)
+            print(f"{name:26} {size:>11,} B  max {r['max_ms']:10.2f} ms  "
+                  f"{ms_per_mb:10.2f} ms/MB", file=sys.stderr)
+            if ms_per_mb > max_ms_per_mb:
+                failures.append((name, size, ms_per_mb))
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "mode": "pathological"}, "results": results}, failures
+
+
+# Cold-start entry points: the detector core, the CLIs built on it and the
+# web app (what each preforked worker or `python app.py` starts with).
+IMPORT_MODULES = ("detector", "stream", "redact", "app")
+LAZY_MODULES = ("http.client", "ssl", "concurrent.futures", "sqlite3")
+# Loaded by the module's own dependencies: werkzeug imports http.client.
+UNAVOIDABLE = {"app": ("http.client", "ssl")}
+IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "ms = (time.perf_counter() - t) * 1000\n"
+    "print(json.dumps([ms, [m for m in {lazy!r} if m in sys.modules]]))\n"
+)
+
+
+def run_import_time(modules, repeats, max_ms):
+    """
+    Times `import module` in repeats fresh interpreters per module. max_ms
+    is {module: budget}. Returns (results, failures); a failure is a
+    (module, reason).
+    """
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("OPENAI_API_KEY", "CADRA_LLM_BASE_URL", "CADRA_CACHE_PATH", "CADRA_JOBS_PATH")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get("PYTHONPATH")]))
+    results = []
+    failures = []
+    for module in modules:
+        lazy = tuple(m for m in LAZY_MODULES if m not in UNAVOIDABLE.get(module, ()))
+        code = IMPORT_PROBE.format(module=module, lazy=lazy)
+        # One untimed run writes the .pyc files.
+        subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True)
+        times = []
+        loaded = set()
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                                 capture_output=True, text=True).stdout
+            ms, lazy = json.loads(out)
+            times.append(ms)
+            loaded.update(lazy)
+        times.sort()
+        r = {"target": "import " + module, "repeats": repeats,
+             "p50_ms": round(_percentile(times, 50), 2), "max_ms": round(times[-1], 2),
+             "loaded": sorted(loaded)}
+        results.append(r)
+        print(f"import {module:19}  p50 {r['p50_ms']:8.2f} ms  max {r['max_ms']:8.2f} ms"
+              + (f"  loads {', '.join(r['loaded'])}" if loaded else ""), file=sys.stderr)
+        if r["p50_ms"] > max_ms[module]:
+            failures.append((module, f"p50 {r['p50_ms']} ms over {max_ms[module]} ms"))
+        if loaded:
+            failures.append((module, "loads " + ", ".join(r["loaded"])))
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "mode": "import-time"}, "results": results}, failures
+
+
+def _per_report_us(fn, items, repeats=3):
+    best = min(_timed(fn, items) for _ in range(repeats))
+    return round(best / len(items) * 1e6, 2)
+
+
+def _timed(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return time.perf_counter() - start
+
+
+def _held_bytes(build):
+    tracemalloc.start()
+    held = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, held
+
+
+def run_reports(count, seed=0, size=3000):
+    """
+    Memory per held report and encode/decode cost for dict, JSON and
+    compact reports of count generated documents.
+    """
+    reports = [detector.analyze(generate_document(size, seed + i), llm=False, cache=False)
+               for i in range(count)]
+    texts = [json.dumps(r, separators=(",", ":")) for r in reports]
+    packed = [compact.pack(r) for r in reports]
+    assert all(compact.CompactReport(p).to_dict() == r for p, r in zip(packed, reports))
+    forms = {
+        "dict": (lambda: [json.loads(t) for t in texts], None, None),
+        "json": (lambda: [json.dumps(r, separators=(",", ":")) for r in reports],
+                 lambda r: json.dumps(r, separators=(",", ":")), json.loads),
+        "compact": (lambda: [compact.CompactReport.from_dict(r) for r in reports],
+                    compact.pack, lambda p: compact.CompactReport(p).to_dict()),
+    }
+    encoded = {"json": texts, "compact": packed}
+    results = []
+    for name, (build, encode, decode) in forms.items():
+        held, _ = _held_bytes(build)
+        r = {"target": name, "reports": count, "held_bytes_per_report": round(held / count, 1)}
+        if encode is not None:
+            r["encoded_bytes_per_report"] = round(sum(map(len, encoded[name])) / count, 1)
+            r["encode_us"] = _per_report_us(encode, reports)
+            r["decode_us"] = _per_report_us(decode, encoded[name])
+        results.append(r)
+        print(f"{name:8} held {r['held_bytes_per_report']:9.1f} B/report"
+              + (f"  encoded {r['encoded_bytes_per_report']:8.1f} B  encode {r['encode_us']:7.2f} us"
+                 f"  decode {r['decode_us']:7.2f} us" if encode else ""), file=sys.stderr)
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "mode": "reports", "document_bytes": size}, "results": results}
+
+
+def compare(current, baseline, tolerance):
+    """
+    Returns a list of (target, size, ratio) for pairs whose throughput fell
+    below (1 - tolerance) of the baseline.
+    """
+    base = {(r["target"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["target"], r["size"]))
+        if not b or not b.get("mb_per_s") or not r.get("mb_per_s"):
+            continue
+        ratio = r["mb_per_s"] / b["mb_per_s"]
+        print(f"{r['target']:26} {r['size']:>11,} B  {ratio:6.2f}x baseline", file=sys.stderr)
+        if ratio < 1 - tolerance:
+            regressions.append((r["target"], r["size"], round(ratio, 3)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CADRA detectors.")
+    parser.add_argument("--sizes", default="1KB,100KB,1MB", help="comma list, e.g. 1KB,1MB,100MB")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma list of " + ", ".join(TARGETS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pii-density", type=float, default=0.05)
+    parser.add_argument("--toxicity", type=float, default=0.02)
+    parser.add_argument("--sentence-len", type=int, default=18)
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("-o", "--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs baseline")
+    parser.add_argument("--pathological", action="store_true",
+                        help="time the sensitive-item detectors on adversarial inputs")
+    parser.add_argument("--max-ms-per-mb", type=float, default=1000.0,
+                        help="latency budget per MB of adversarial input")
+    parser.add_argument("--import-time", action="store_true",
+                        help="time cold imports of " + ", ".join(IMPORT_MODULES))
+    parser.add_argument("--max-import-ms", type=float, default=150.0,
+                        help="median import time budget per module")
+    parser.add_argument("--max-app-import-ms", type=float, default=400.0,
+                        help="median import time budget for app (Flask included)")
+    parser.add_argument("--reports", type=int, metavar="N",
+                        help="compare dict, JSON and compact storage of N reports")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        budgets = {m: args.max_import_ms for m in IMPORT_MODULES}
+        budgets["app"] = args.max_app_import_ms
+        current, failures = run_import_time(IMPORT_MODULES, args.repeats or 10, budgets)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+        for module, reason in failures:
+            print(f"SLOW IMPORT {module}: {reason}", file=sys.stderr)
+        return 1 if failures else 0
+    if args.reports:
+        current = run_reports(args.reports, args.seed)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+        return 0
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    if args.pathological:
+        current, failures = run_pathological(sizes, list(PATHOLOGICAL), args.max_ms_per_mb)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+        for name, size, ms in failures:
+            print(f"OVER BUDGET {name} @ {size} B: {ms} ms/MB", file=sys.stderr)
+        return 1 if failures else 0
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error("unknown targets: " + ", ".join(unknown))
+
+    current = run(sizes, targets, args.seed, args.pii_density, args.toxicity,
+                  args.sentence_len, args.repeats)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        if regressions:
+            for target, size, ratio in regressions:
+                print(f"REGRESSION {target} @ {size} B: {ratio}x baseline", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Content-addressed result cache.
+
+Entries are keyed by a SHA-256 of the normalized document plus a version
+string (detector or prompt version), so bumping the version invalidates
+old results. Values are stored encoded (JSON unless the cache is given
+another codec), so every hit hands back a fresh copy the caller may mutate.
+
+Two tiers: an in-process LRU bounded by entry count and TTL, and an
+optional sqlite file that survives restarts.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _json_dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def normalize(text: str):
+    # Only strip: no detector pattern starts or ends with whitespace, so
+    # leading/trailing whitespace never changes a report.
+    return text.strip()
+
+
+class ResultCache:
+    def __init__(self, name, version, max_entries=1024, ttl=3600, path=None, codec=None):
+        """
+        name: namespace, also the sqlite table name.
+        max_entries: LRU capacity; 0 disables the memory tier.
+        ttl: seconds an entry stays valid in either tier; None for no expiry.
+        path: sqlite file for the disk tier; None disables it.
+        codec: (encode, decode) pair for the stored values, str or bytes
+        (default JSON).
+        """
+        self.name = name
+        self.version = version
+        self._encode, self._decode = codec or (_json_dumps, json.loads)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._open()
+            # sqlite connections must not cross fork(); preforked workers
+            # and batch processes each open their own.
+            os.register_at_fork(after_in_child=self._open)
+
+    def _open(self):
+        # Imported here: without a cache file, sqlite3 is never loaded.
+        import sqlite3
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self._path, timeout=10, check_same_thread=False)
+        self._db.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.name}" '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    def key(self, text: str, variant=""):
+        """
+        variant: extra key component for results that depend on options,
+        e.g. which detectors ran.
+        """
+        h = hashlib.sha256()
+        h.update(f"{self.name}:{self.version}".encode())
+        if variant:
+            h.update(f":{variant}".encode())
+        h.update(b"\0")
+        h.update(normalize(text).encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, text: str, variant=""):
+        """
+        Returns the cached value for text, or None on a miss.
+        """
+        k = self.key(text, variant)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(k)
+            if entry is not None:
+                created, encoded = entry
+                if not self._expired(created, now):
+                    self._lru.move_to_end(k)
+                    self.hits += 1
+                    return self._decode(encoded)
+                del self._lru[k]
+            if self._db is not None:
+                row = self._db.execute(
+                    f'SELECT value, created FROM "{self.name}" WHERE key = ?', (k,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    self._remember(k, row[1], row[0])
+                    self.disk_hits += 1
+                    return self._decode(row[0])
+            self.misses += 1
+            return None
+
+    def set(self, text: str, value, variant=""):
+        k = self.key(text, variant)
+        encoded = self._encode(value)
+        now = time.time()
+        with self._lock:
+            self._remember(k, now, encoded)
+            if self._db is not None:
+                self._db.execute(
+                    f'INSERT OR REPLACE INTO "{self.name}" (key, value, created) VALUES (?, ?, ?)',
+                    (k, encoded, now)
+                )
+                self._db.commit()
+
+    def _remember(self, k, created, encoded):
+        if self.max_entries <= 0:
+            return
+        self._lru[k] = (created, encoded)
+        self._lru.move_to_end(k)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self):
+        """
+        Drops expired entries from both tiers.
+        """
+        if self.ttl is None:
+            return
+        now = time.time()
+        with self._lock:
+            for k in [k for k, (created, _) in self._lru.items() if self._expired(created, now)]:
+                del self._lru[k]
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM "{self.name}" WHERE created < ?', (now - self.ttl,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
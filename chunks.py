@@ -0,0 +1,92 @@
+"""
+Token-budgeted chunking for map-reduce LLM analysis of long documents.
+
+The document is packed into chunks of whole sentences that fit a token
+budget. Only chunks the heuristics flag (PII, toxic or suspicious hits) go
+to the model, and the per-chunk JSON answers are merged back into one
+summary/issues/rewrite_suggestions/advice report.
+"""
+CHARS_PER_TOKEN = 4
+MAX_REWRITES = 3
+
+
+def estimate_tokens(text: str):
+    """
+    Rough token count (about four characters per token for English).
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def chunk_sentences(sentences, budget):
+    """
+    Packs consecutive sentences into chunks of at most budget tokens. A
+    sentence longer than the budget is cut into budget-sized pieces.
+    """
+    limit = budget * CHARS_PER_TOKEN
+    chunks = []
+    cur = []
+    size = 0
+    for s in sentences:
+        while len(s) > limit:
+            if cur:
+                chunks.append(" ".join(cur))
+                cur, size = [], 0
+            chunks.append(s[:limit])
+            s = s[limit:]
+        if cur and size + 1 + len(s) > limit:
+            chunks.append(" ".join(cur))
+            cur, size = [], 0
+        if s:
+            cur.append(s)
+            size += len(s) + (1 if size else 0)
+    if cur:
+        chunks.append(" ".join(cur))
+    return chunks
+
+
+def flag_chunks(scanner, chunks):
+    """
+    Returns [(index, chunk, hits)] for chunks with heuristic hits, where
+    hits counts distinct sensitive items plus toxic and suspicious phrases.
+    """
+    flagged = []
+    for i, chunk in enumerate(chunks):
+        sensitive = scanner.sensitive(chunk)
+        phrases = scanner.phrase_hits(chunk.lower())
+        hits = (sum(map(len, sensitive.values()))
+                + len(phrases["toxic"]) + len(phrases["suspicious"]))
+        if hits:
+            flagged.append((i, chunk, hits))
+    return flagged
+
+
+def merge_results(parts, total):
+    """
+    Merges [(chunk index, LLM result)] from one document of total chunks
+    into a single result. Failed chunks are counted in 'chunks'; the
+    merged result is an error only if every chunk failed.
+    """
+    summaries, issues, rewrites, advice = [], {}, {}, {}
+    failed = 0
+    for i, r in sorted(parts, key=lambda p: p[0]):
+        if "error" in r:
+            failed += 1
+            continue
+        summary = r.get("summary") or r.get("raw")
+        if summary:
+            summaries.append(f"Passage {i + 1}: {summary}")
+        for out, key in ((issues, "issues"), (rewrites, "rewrite_suggestions"), (advice, "advice")):
+            for item in r.get(key) or []:
+                out.setdefault(item if isinstance(item, str) else str(item), None)
+    meta = {"total": total, "analyzed": len(parts) - failed, "failed": failed}
+    if parts and failed == len(parts):
+        return {"error": next(r["error"] for _, r in parts), "chunks": meta}
+    if not parts:
+        summaries.append("No passage was flagged by the heuristics; the LLM was not consulted.")
+    return {
+        "summary": " ".join(summaries),
+        "issues": list(issues),
+        "rewrite_suggestions": list(rewrites)[:MAX_REWRITES],
+        "advice": list(advice),
+        "chunks": meta,
+    }
@@ -0,0 +1,317 @@
+"""
+Compact reports for batch runs and caches that hold many of them.
+
+    data = pack(report)
+    r = CompactReport(data)          # or unpack(data)
+    r.score                          # read straight from the bytes
+    r.to_dict() == report            # decoded only when asked for
+
+A CompactReport keeps only the packed bytes (one __slots__ attribute). It
+is also a read-only Mapping of the report's keys, but each lookup other
+than score decodes the whole report, so call to_dict() once before
+reading several fields. Nothing derivable is stored. risk_level, evidence
+and the heuristic llm section are rebuilt from the sections
+(pipeline.risk_level_for / evidence_from / fallback_from). The match
+lists are one UTF-8 blob, not a list of string objects. Like the report
+cache, this expects JSON-serializable reports.
+
+Layout (version 1, little-endian), in this order:
+    header   magic b"CR", version, score, section bitmask, llm kind
+    numbers  tone: exclamations, caps_words, questions, tone_score (q);
+             structure: num_sentences, num_words, long_sentences_count (q),
+             avg_sentence_len, avg_word_len (d); each only if present
+    counts   one per match list of the present sections: a byte, or 255
+             and a u32; then a d per similar document (its jaccard)
+    extra    u32 length + JSON for whatever does not fit the layout:
+             an LLM answer, other sections and keys, odd values
+    blob     every match string, NUL-joined, UTF-8
+Anything that cannot be stored exactly goes to extra, so to_dict()
+always equals the packed report.
+"""
+import json
+import struct
+from collections.abc import Mapping
+
+from detectors import DETECTORS
+from pipeline import evidence_from, fallback_from, risk_level_for
+from scanner import SENSITIVE_KEYS
+
+MAGIC = b"CR"
+VERSION = 1
+
+HEADER = struct.Struct("<2sBBBB")
+TONE_NUMS = struct.Struct("<4q")
+STRUCTURE_NUMS = struct.Struct("<3q2d")
+U32 = struct.Struct("<I")
+
+# Sections with a fixed layout, in bitmask order: (section, list keys).
+SECTIONS = (
+    ("sensitive", tuple(key for key, _ in SENSITIVE_KEYS)),
+    ("tone", ("toxic_hits", "suspicious_hits")),
+    ("structure", ()),
+    ("plagiarism_hint", ("template_hits", "repeated_terms")),
+    ("similar_documents", ()),
+)
+BIT = {name: 1 << i for i, (name, _) in enumerate(SECTIONS)}
+SENSITIVE, TONE, STRUCTURE, PLAGIARISM, SIMILAR = BIT.values()
+TONE_KEYS = ("toxic_hits", "suspicious_hits", "exclamations", "caps_words", "questions", "tone_score")
+STRUCTURE_KEYS = ("num_sentences", "num_words", "avg_sentence_len", "avg_word_len", "long_sentences_count")
+
+LLM_NONE, LLM_FALLBACK, LLM_EXTRA = 0, 1, 2
+
+# Section bitmask -> [(section, key)] of its match lists, in blob order.
+LIST_KEYS = [
+    [(name, key) for name, keys in SECTIONS if present & BIT[name] for key in keys]
+    + ([("similar_documents", "id")] if present & BIT["similar_documents"] else [])
+    for present in range(1 << len(SECTIONS))
+]
+
+
+def _strings_ok(values):
+    # Strings that survive a NUL-joined blob: non-empty, NUL-free.
+    if type(values) is not list:
+        return False
+    try:
+        return "\0" not in "".join(values) and all(values)
+    except TypeError:
+        return False
+
+
+def _ints_ok(*values):
+    return all(type(v) is int and -(1 << 63) <= v < 1 << 63 for v in values)
+
+
+def _fits(name, section):
+    """
+    Whether section can use the fixed layout of name.
+    """
+    if name == "sensitive":
+        return (isinstance(section, dict) and tuple(section) == SECTIONS[0][1]
+                and all(_strings_ok(v) for v in section.values()))
+    if name == "tone":
+        return (isinstance(section, dict) and tuple(section) == TONE_KEYS
+                and _strings_ok(section["toxic_hits"]) and _strings_ok(section["suspicious_hits"])
+                and _ints_ok(*(section[k] for k in TONE_KEYS[2:])))
+    if name == "structure":
+        return (isinstance(section, dict) and tuple(section) == STRUCTURE_KEYS
+                and _ints_ok(section["num_sentences"], section["num_words"], section["long_sentences_count"])
+                and type(section["avg_sentence_len"]) is float and type(section["avg_word_len"]) is float)
+    if name == "plagiarism_hint":
+        return (isinstance(section, dict) and tuple(section) == SECTIONS[3][1]
+                and all(_strings_ok(v) for v in section.values()))
+    if name == "similar_documents":
+        return (isinstance(section, list)
+                and all(isinstance(d, dict) and tuple(d) == ("id", "jaccard") for d in section)
+                and _strings_ok([d["id"] for d in section])
+                and all(type(d["jaccard"]) is float for d in section))
+    return False
+
+
+def pack(report):
+    """
+    Serializes a report dict to bytes (see the module docstring).
+    """
+    score = report.get("score")
+    if type(score) is not int or not 0 <= score <= 255:
+        raise ValueError("report has no packable score")
+    present = 0
+    sections = {}
+    extra = {}
+    for name, _ in SECTIONS:
+        if name in report:
+            if _fits(name, report[name]):
+                present |= BIT[name]
+                sections[name] = report[name]
+            else:
+                extra[name] = report[name]
+    # Sections that did not fit count for the derived fields too.
+    every = dict(sections, **extra)
+    for key, value in report.items():
+        if key in ("score", "llm") or key in BIT:
+            continue
+        if key == "risk_level" and value == risk_level_for(score):
+            continue
+        if key == "evidence" and value == evidence_from(every):
+            continue
+        extra[key] = value
+    llm = report.get("llm")
+    if llm is None:
+        llm_kind = LLM_NONE
+    elif llm == fallback_from(every):
+        llm_kind = LLM_FALLBACK
+    else:
+        llm_kind = LLM_EXTRA
+        extra["llm"] = llm
+    absent = [key for key in ("risk_level", "evidence", "llm") if key not in report]
+    if absent:
+        extra["_absent"] = absent
+
+    parts = [HEADER.pack(MAGIC, VERSION, score, present, llm_kind)]
+    tone = sections.get("tone")
+    if tone is not None:
+        parts.append(TONE_NUMS.pack(*(tone[k] for k in TONE_KEYS[2:])))
+    st = sections.get("structure")
+    if st is not None:
+        parts.append(STRUCTURE_NUMS.pack(st["num_sentences"], st["num_words"], st["long_sentences_count"],
+                                         st["avg_sentence_len"], st["avg_word_len"]))
+    similar = sections.get("similar_documents")
+    lists = [sections[name][key] if name != "similar_documents" else [d["id"] for d in similar]
+             for name, key in LIST_KEYS[present]]
+    counts = [len(values) for values in lists]
+    if max(counts, default=0) < 255:
+        parts.append(bytes(counts))
+    else:
+        parts.append(b"".join(bytes([n]) if n < 255 else b"\xff" + U32.pack(n) for n in counts))
+    if similar:
+        parts.append(struct.pack(f"<{len(similar)}d", *(d["jaccard"] for d in similar)))
+    extra_json = json.dumps(extra, separators=(",", ":")).encode("utf-8") if extra else b""
+    parts.append(U32.pack(len(extra_json)))
+    parts.append(extra_json)
+    parts.append("\0".join(v for values in lists for v in values).encode("utf-8", "surrogatepass"))
+    return b"".join(parts)
+
+
+class CompactReport(Mapping):
+    """
+    Read-only Mapping over a packed report.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        if bytes(data[:3]) != MAGIC + bytes([VERSION]):
+            raise ValueError("not a version %d compact report" % VERSION)
+        self.data = bytes(data)
+
+    @classmethod
+    def from_dict(cls, report):
+        return cls(pack(report))
+
+    @property
+    def score(self):
+        return self.data[3]
+
+    def _decode(self):
+        """
+        Returns (sections, extra, llm kind) with every section decoded.
+        """
+        data = self.data
+        _, _, _, present, llm_kind = HEADER.unpack_from(data)
+        pos = HEADER.size
+        tone_nums = st_nums = None
+        if present & TONE:
+            tone_nums = TONE_NUMS.unpack_from(data, pos)
+            pos += TONE_NUMS.size
+        if present & STRUCTURE:
+            st_nums = STRUCTURE_NUMS.unpack_from(data, pos)
+            pos += STRUCTURE_NUMS.size
+        list_keys = LIST_KEYS[present]
+        counts = data[pos:pos + len(list_keys)]
+        if 255 not in counts:
+            pos += len(list_keys)
+        else:
+            counts = []
+            for _ in list_keys:
+                n = data[pos]
+                pos += 1
+                if n == 255:
+                    n = U32.unpack_from(data, pos)[0]
+                    pos += 4
+                counts.append(n)
+        jaccards = ()
+        if present & SIMILAR and counts[-1]:
+            jaccards = struct.unpack_from(f"<{counts[-1]}d", data, pos)
+            pos += 8 * counts[-1]
+        (extra_len,) = U32.unpack_from(data, pos)
+        pos += 4
+        extra = json.loads(data[pos:pos + extra_len]) if extra_len else {}
+        pos += extra_len
+        strings = data[pos:].decode("utf-8", "surrogatepass").split("\0") if any(counts) else []
+        lists = {}
+        i = 0
+        for key, n in zip(list_keys, counts):
+            lists[key] = strings[i:i + n] if n else []
+            i += n
+        sections = {}
+        if present & SENSITIVE:
+            sections["sensitive"] = {key: lists["sensitive", key] for key in SECTIONS[0][1]}
+        if present & TONE:
+            sections["tone"] = {
+                "toxic_hits": lists["tone", "toxic_hits"], "suspicious_hits": lists["tone", "suspicious_hits"],
+                "exclamations": tone_nums[0], "caps_words": tone_nums[1], "questions": tone_nums[2],
+                "tone_score": tone_nums[3],
+            }
+        if present & STRUCTURE:
+            sections["structure"] = {
+                "num_sentences": st_nums[0], "num_words": st_nums[1], "avg_sentence_len": st_nums[3],
+                "avg_word_len": st_nums[4], "long_sentences_count": st_nums[2],
+            }
+        if present & PLAGIARISM:
+            sections["plagiarism_hint"] = {
+                "template_hits": lists["plagiarism_hint", "template_hits"],
+                "repeated_terms": lists["plagiarism_hint", "repeated_terms"],
+            }
+        if present & SIMILAR:
+            ids = lists["similar_documents", "id"]
+            sections["similar_documents"] = [{"id": d, "jaccard": j} for d, j in zip(ids, jaccards)]
+        return sections, extra, llm_kind
+
+    def to_dict(self):
+        """
+        The report as the dict analyze() returned, in the same key order.
+        """
+        sections, extra, llm_kind = self._decode()
+        absent = extra.pop("_absent", ())
+        every = dict(sections, **{k: v for k, v in extra.items() if k in BIT})
+        score = self.score
+        report = {"score": score}
+        report["risk_level"] = extra.pop("risk_level") if "risk_level" in extra else risk_level_for(score)
+        report["evidence"] = extra.pop("evidence") if "evidence" in extra else evidence_from(every)
+        # Sections in registration order, as Analysis.report() writes them.
+        for d in DETECTORS.values():
+            if d.section in sections:
+                report[d.section] = sections[d.section]
+            elif d.section in extra:
+                report[d.section] = extra.pop(d.section)
+        for name in BIT:
+            if name in every and name not in report:
+                report[name] = extra.pop(name) if name in extra else sections[name]
+        if llm_kind == LLM_FALLBACK:
+            report["llm"] = fallback_from(every)
+        else:
+            report["llm"] = extra.pop("llm", None)
+        report.update(extra)
+        for key in absent:
+            del report[key]
+        return report
+
+    def __getitem__(self, key):
+        if key == "score":
+            return self.score
+        return self.to_dict()[key]
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __repr__(self):
+        return f"<CompactReport score={self.score} {len(self.data)} bytes>"
+
+
+def unpack(data):
+    return CompactReport(data)
+
+
+def loads(data):
+    """
+    The report dict from pack() bytes, or from JSON text (report cache
+    entries written before the cache stored packed reports).
+    """
+    if isinstance(data, str):
+        return json.loads(data)
+    return CompactReport(data).to_dict()
+
+
+# ResultCache codec for reports.
+CODEC = (pack, loads)
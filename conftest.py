@@ -0,0 +1,70 @@
+"""
+Keeps the repository root importable when running plain `pytest`, and
+holds the fixtures shared by the tests.
+"""
+import random
+import threading
+
+import pytest
+
+import detector
+import llm_mock
+
+WORDS = ("the", "report", "meeting", "budget", "is", "late", "we", "agreed", "URGENT", "NOW",
+         "plan", "skill", "team", "data", "ok")
+
+
+@pytest.fixture
+def mock_llm():
+    """
+    Starts llm_mock servers: mock_llm(**MockState options) returns the
+    server, serving on a free port; its URL is server.url.
+    """
+    servers = []
+
+    def start(**options):
+        server = llm_mock.make_server(**options)
+        server.url = "http://127.0.0.1:%d/v1" % server.server_address[1]
+        server.stats = server.RequestHandlerClass.state.stats
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def random_document(rng, pieces=200):
+    """
+    Text mixing plain words with every kind of detector hit: lexicon
+    phrases, emails, URLs, phone and long numbers, IPs, capitals, sentence
+    ends and paragraph breaks.
+    """
+    lexicon = sorted(detector.TOXIC_WORDS) + detector.SUSPICIOUS_PHRASES + detector.COMMON_TEMPLATES
+    makers = (
+        lambda: rng.choice(WORDS),
+        lambda: rng.choice(WORDS),
+        lambda: rng.choice(WORDS),
+        lambda: rng.choice(lexicon),
+        lambda: rng.choice(lexicon).upper(),
+        lambda: "%s.%d@example.com" % (rng.choice(WORDS).lower(), rng.randrange(100)),
+        lambda: "https://%s.example.org/%d" % (rng.choice(WORDS).lower(), rng.randrange(1000)),
+        lambda: "www.%s.in" % rng.choice(WORDS).lower(),
+        lambda: "+91 9%09d" % rng.randrange(10 ** 9),
+        lambda: "%04d %04d %04d" % (rng.randrange(10 ** 4), rng.randrange(10 ** 4), rng.randrange(10 ** 4)),
+        lambda: str(rng.randrange(10 ** 8, 10 ** 12)),
+        lambda: ".".join(str(rng.randrange(256)) for _ in range(4)),
+    )
+    seps = (" ", " ", " ", " ", ". ", "! ", "? ", ", ", "\n", "\n\n", "!! ")
+    return "".join(rng.choice(makers)() + rng.choice(seps) for _ in range(pieces))
+
+
+@pytest.fixture
+def documents():
+    """
+    Fixed-seed random documents of varying length, plus edge cases.
+    """
+    rng = random.Random(20261017)
+    return ["", "a", "x@y.io"] + [random_document(rng, rng.randrange(1, 400)) for _ in range(40)]
@@ -0,0 +1,173 @@
+"""
+Columnar scoring and corpus statistics over batches of reports.
+
+Columns collects one compact integer column per signal (email and phone
+counts, toxic hits, tone score, long sentences, ...) as reports stream in.
+score() then applies the Analysis.score formula to the whole batch at once
+with NumPy, and summarize() adds score and signal distributions,
+percentiles and the top offending documents.
+
+    cols = Columns()
+    for doc_id, report in analyze_batch(docs):
+        cols.append(doc_id, report)
+    summary = summarize(cols)
+
+Requires numpy; batch.py imports this module only for --summary.
+"""
+from array import array
+
+import numpy as np
+
+SECTIONS = ("sensitive", "tone", "structure", "plagiarism_hint")
+
+# (column, section, key, whether the value is a list to count).
+SIGNALS = (
+    ("emails", "sensitive", "emails", True),
+    ("phones", "sensitive", "phones", True),
+    ("urls", "sensitive", "urls", True),
+    ("aadhar_like", "sensitive", "aadhar_like", True),
+    ("long_numbers", "sensitive", "long_numbers", True),
+    ("ips", "sensitive", "ips", True),
+    ("toxic_hits", "tone", "toxic_hits", True),
+    ("suspicious_hits", "tone", "suspicious_hits", True),
+    ("tone_score", "tone", "tone_score", False),
+    ("exclamations", "tone", "exclamations", False),
+    ("caps_words", "tone", "caps_words", False),
+    ("num_sentences", "structure", "num_sentences", False),
+    ("num_words", "structure", "num_words", False),
+    ("long_sentences", "structure", "long_sentences_count", False),
+    ("template_hits", "plagiarism_hint", "template_hits", True),
+)
+
+RISK_LEVELS = np.array(["Low", "Medium", "High"])
+# Lower bounds of Medium and High, as in Analysis.risk_level.
+RISK_BOUNDS = (31, 61)
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Columns:
+    def __init__(self):
+        self.ids = []
+        self._signals = {name: array("q") for name, _, _, _ in SIGNALS}
+        # Whether each report carried the section; a detector that did not
+        # run must not score (a missing tone section is not tone_score 0).
+        self._present = {section: array("b") for section in SECTIONS}
+        self._layout = [
+            (section, self._present[section],
+             [(self._signals[name].append, key, counted)
+              for name, sec, key, counted in SIGNALS if sec == section])
+            for section in SECTIONS
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, doc_id, report):
+        self.ids.append(doc_id)
+        for section, present, signals in self._layout:
+            values = report.get(section)
+            present.append(values is not None)
+            if values is None:
+                for add, _, _ in signals:
+                    add(0)
+                continue
+            for add, key, counted in signals:
+                value = values.get(key)
+                add(len(value) if counted else value)
+
+    def extend(self, pairs):
+        for doc_id, report in pairs:
+            self.append(doc_id, report)
+        return self
+
+    def __getitem__(self, name):
+        """
+        A signal or section-presence column as a NumPy array (a copy, so
+        appending stays possible).
+        """
+        if name in self._signals:
+            return np.array(self._signals[name], dtype=np.int64)
+        return np.array(self._present[name], dtype=bool)
+
+
+def score(cols):
+    """
+    Analysis.score for every document, as an int64 array.
+    """
+    s = 20 * (cols["emails"] > 0) + 20 * (cols["phones"] > 0)
+    s = s + 25 * ((cols["aadhar_like"] > 0) | (cols["long_numbers"] > 0))
+    s = s + np.minimum(20, cols["suspicious_hits"] * 6) + np.minimum(20, cols["toxic_hits"] * 12)
+    s = s + np.where(cols["tone"], np.maximum(0, (50 - cols["tone_score"]) // 2), 0)
+    s = s + np.minimum(10, cols["long_sentences"] * 3)
+    s = s + np.minimum(10, cols["template_hits"] * 5)
+    return np.clip(s, 0, 100).astype(np.int64)
+
+
+def risk_levels(scores):
+    """
+    'Low' / 'Medium' / 'High' for each score.
+    """
+    return RISK_LEVELS[np.digitize(scores, RISK_BOUNDS)]
+
+
+def _percentiles(values, qs):
+    if not len(values):
+        return {f"p{q}": None for q in qs}
+    return {f"p{q}": round(float(v), 2) for q, v in zip(qs, np.percentile(values, qs))}
+
+
+def top_offenders(scores, n):
+    """
+    Indexes of the n highest scores, highest first; ties keep input order.
+    """
+    if n <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    n = min(n, len(scores))
+    cutoff = np.partition(scores, len(scores) - n)[len(scores) - n]
+    candidates = np.flatnonzero(scores >= cutoff)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:n]
+
+
+def summarize(cols, top=10, percentiles=PERCENTILES):
+    """
+    Corpus statistics: risk level counts, score distribution (percentiles
+    and a ten-point histogram), per-signal distributions and the top
+    offending documents with their non-zero signals.
+    """
+    n = len(cols)
+    # Materialize each column once.
+    cols = {name: cols[name] for name in (*(sig[0] for sig in SIGNALS), *SECTIONS)} | {"ids": cols.ids}
+    scores = score(cols)
+    levels = np.digitize(scores, RISK_BOUNDS)
+    hist = np.bincount(np.minimum(scores // 10, 9), minlength=10) if n else np.zeros(10, dtype=np.int64)
+    signals = {}
+    for name, section, _, _ in SIGNALS:
+        values = cols[name][cols[section]]
+        signals[name] = {
+            "documents": int(len(values)),
+            "nonzero": int(np.count_nonzero(values)),
+            "mean": round(float(values.mean()), 3) if len(values) else None,
+            "max": int(values.max()) if len(values) else None,
+            **_percentiles(values, percentiles),
+        }
+    offenders = []
+    for i in top_offenders(scores, top):
+        offenders.append({
+            "id": cols["ids"][i],
+            "score": int(scores[i]),
+            "risk_level": str(RISK_LEVELS[levels[i]]),
+            "signals": {name: int(cols[name][i]) for name, _, _, _ in SIGNALS
+                        if name != "tone_score" and cols[name][i]},
+        })
+    return {
+        "documents": n,
+        "risk_levels": {str(lvl): int(c) for lvl, c in zip(RISK_LEVELS, np.bincount(levels, minlength=3))},
+        "score": {
+            "mean": round(float(scores.mean()), 3) if n else None,
+            "std": round(float(scores.std()), 3) if n else None,
+            **_percentiles(scores, percentiles),
+            "histogram": {f"{10 * b}-{10 * b + 9 if b < 9 else 100}": int(c) for b, c in enumerate(hist)},
+        },
+        "signals": signals,
+        "top": offenders,
+    }
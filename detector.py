@@ -1,15 +1,41 @@
 import re, os, json
-from collections import Counter
+from scanner import Scanner
+from pipeline import Analysis
+from cache import ResultCache
+import compact
+from detectors import DETECTORS, plan, signature, split
+from metrics import Timings, timed
+from pii import RunStartPattern
+from llm import LLMClient, MicroBatcher
+from chunks import chunk_sentences, estimate_tokens, flag_chunks, merge_results
+import threading
 
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except Exception:
-    OPENAI_AVAILABLE = False
+# Configured from OPENAI_API_KEY / CADRA_LLM_BASE_URL; None disables the LLM.
+LLM_CLIENT = LLMClient.from_env()
+# CADRA_LLM_BATCH=N sends up to N concurrent documents of at most
+# CADRA_LLM_BATCH_MAX_CHARS characters as one LLM request.
+LLM_BATCH_SIZE = int(os.getenv("CADRA_LLM_BATCH", "1"))
+LLM_BATCH_MAX_CHARS = int(os.getenv("CADRA_LLM_BATCH_MAX_CHARS", "2000"))
+# Documents over CADRA_LLM_CHUNK_TOKENS are analyzed in chunks of that size;
+# at most CADRA_LLM_MAX_CHUNKS flagged chunks are sent.
+LLM_CHUNK_TOKENS = int(os.getenv("CADRA_LLM_CHUNK_TOKENS", "2000"))
+LLM_MAX_CHUNKS = int(os.getenv("CADRA_LLM_MAX_CHUNKS", "16"))
+# Built on the first chunked LLM call (see _chunk_pool), so importing this
+# module does not load concurrent.futures.
+_CHUNK_POOL = None
+_CHUNK_POOL_LOCK = threading.Lock()
 
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-if OPENAI_AVAILABLE and OPENAI_KEY:
-    openai.api_key = OPENAI_KEY
+# Set CADRA_WORD_BOUNDARY=1 so lexicon phrases only match whole words
+# ("kill" no longer matches inside "skill").
+PHRASE_WORD_BOUNDARY = os.getenv("CADRA_WORD_BOUNDARY") == "1"
+
+# Bump when detector output or the LLM prompt changes; cached results from
+# older versions are then ignored.
+DETECTOR_VERSION = "1" + ("-wb" if PHRASE_WORD_BOUNDARY else "")
+PROMPT_VERSION = "1"
+
+# Set CADRA_TIMINGS=1 to add a per-stage 'timings' section to every report.
+TIMINGS_ENABLED = os.getenv("CADRA_TIMINGS") == "1"
 
 TOXIC_WORDS = set([
     "stupid","idiot","dumb","kill","hate","worthless","trash","moron","screw you","shut up"
@@ -31,191 +57,304 @@ RE_AADHAAR = re.compile(r"\d{4}\s*\d{4}\s*\d{4}")
 RE_NUMERIC_LONG = re.compile(r"\d{9,}")
 RE_IP = re.compile(r"(?:\d{1,3}\.){3}\d{1,3}")
 RE_URL = re.compile(r"https?://\S+|www\.\S+")
+RE_CAPS = re.compile(r"[A-Z]{2,}")
+RE_TERM = re.compile(r"\w{4,}")
+RE_WORD = re.compile(r"\w+")
+RE_TOKEN = re.compile(r"\S+")
+RE_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+SCANNER = Scanner(
+    {
+        "email": RunStartPattern(RE_EMAIL, "[a-zA-Z0-9_.+-]"),
+        "phone": RE_PHONE,
+        "aadhaar": RE_AADHAAR,
+        "numeric_long": RE_NUMERIC_LONG,
+        "ip": RE_IP,
+        "url": RE_URL,
+        "caps": RE_CAPS,
+        "term": RE_TERM,
+        "word": RE_WORD,
+        "token": RE_TOKEN,
+        "sentence_split": RE_SENTENCE_SPLIT,
+    },
+    TOXIC_WORDS, SUSPICIOUS_PHRASES, COMMON_TEMPLATES,
+    word_boundary=PHRASE_WORD_BOUNDARY
+)
+
+_CACHE_PATH = os.getenv("CADRA_CACHE_PATH") or None
+_CACHE_SIZE = int(os.getenv("CADRA_CACHE_SIZE", "1024"))
+_CACHE_TTL = int(os.getenv("CADRA_CACHE_TTL", "86400"))
+# Reports are cached packed (compact.py): a few hundred bytes instead of
+# the JSON text.
+REPORT_CACHE = ResultCache("report", DETECTOR_VERSION, _CACHE_SIZE, _CACHE_TTL, _CACHE_PATH, compact.CODEC)
+LLM_CACHE = ResultCache("llm", PROMPT_VERSION, _CACHE_SIZE, _CACHE_TTL, _CACHE_PATH)
+
+def find_sensitive_items(text: str, spans=False):
+    """
+    spans=True returns {key: [(start, end, match)]} for every occurrence
+    instead of the de-duplicated matches (see redact.py).
+    """
+    return SCANNER.sensitive_spans(text) if spans else SCANNER.sensitive(text)
 
-def find_sensitive_items(text: str):
-    found = {
-        "emails": RE_EMAIL.findall(text),
-        "phones": RE_PHONE.findall(text),
-        "urls": RE_URL.findall(text),
-        "aadhar_like": RE_AADHAAR.findall(text),
-        "long_numbers": RE_NUMERIC_LONG.findall(text),
-        "ips": RE_IP.findall(text),
-    }
-    for k in list(found.keys()):
-        found[k] = list(dict.fromkeys(found[k]))
-    return found
-
-def simple_tone_and_toxicity(text: str):
-    text_low = text.lower()
-    toxic_hits = [w for w in TOXIC_WORDS if w in text_low]
-    suspicious_hits = [p for p in SUSPICIOUS_PHRASES if p in text_low]
-    exclam = text.count("!")
-    caps_words = sum(1 for w in re.findall(r"[A-Z]{2,}", text))
-    questions = text.count("?")
-    tone = 50
-    tone -= len(toxic_hits) * 20
-    tone -= len(suspicious_hits) * 8
-    tone -= min(caps_words,5) * 3
-    tone -= min(exclam,5) * 2
-    tone += min(questions,3) * 1
-    tone = max(0, min(100, tone))
-    return {
-        "toxic_hits": toxic_hits,
-        "suspicious_hits": suspicious_hits,
-        "exclamations": exclam,
-        "caps_words": caps_words,
-        "questions": questions,
-        "tone_score": tone
-    }
+def simple_tone_and_toxicity(text: str, spans=False):
+    """
+    spans=True adds 'spans': {'toxic': [...], 'suspicious': [...]} with the
+    (start, end, phrase) of every hit.
+    """
+    result = SCANNER.tone(text, SCANNER.phrase_hits(text.lower()))
+    if spans:
+        found = SCANNER.phrase_spans(text)
+        result["spans"] = {"toxic": found["toxic"], "suspicious": found["suspicious"]}
+    return result
 
 def structure_and_clarity(text: str):
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    sentences = [s for s in sentences if s.strip()]
-    words = re.findall(r"\w+", text)
-    avg_sentence_len = (sum(len(s.split()) for s in sentences) / len(sentences)) if sentences else 0
-    avg_word_len = (sum(len(w) for w in words) / len(words)) if words else 0
-    long_sentences = [s for s in sentences if len(s.split()) > 30]
-    return {
-        "num_sentences": len(sentences),
-        "num_words": len(words),
-        "avg_sentence_len": round(avg_sentence_len,2),
-        "avg_word_len": round(avg_word_len,2),
-        "long_sentences_count": len(long_sentences)
-    }
-
-def plagiarism_hint(text: str):
+    word_count, word_chars = SCANNER.word_stats(text)
+    return SCANNER.structure(SCANNER.sentences(text), word_count, word_chars)
+
+def plagiarism_hint(text: str, spans=False):
+    """
+    spans=True adds 'spans': {'templates': [(start, end, phrase), ...]}.
+    """
     low = text.lower()
-    hits = [t for t in COMMON_TEMPLATES if t in low]
-    phrases = re.findall(r"\w{4,}", low)
-    c = Counter(phrases)
-    repeated_phrases = [w for w,n in c.items() if n>5][:10]
-    return {"template_hits": hits, "repeated_terms": repeated_phrases}
+    result = SCANNER.plagiarism(SCANNER.phrase_hits(low), SCANNER.term_counts(low))
+    if spans:
+        result["spans"] = {"templates": SCANNER.phrase_spans(text)["templates"]}
+    return result
 
 def llm_analyze_openai(text: str):
     """
     Safe OpenAI LLM call with escaped text & fallback.
+
+    Documents over LLM_CHUNK_TOKENS are split into sentence chunks; only
+    chunks the heuristics flag are sent, concurrently, and their answers
+    are merged into one result.
+    """
+    if LLM_CLIENT is None:
+        return None
+    if estimate_tokens(text) <= LLM_CHUNK_TOKENS:
+        return _llm_cached(text)
+    cached = LLM_CACHE.get(text)
+    if cached is not None:
+        return cached
+    result = _llm_map_reduce(text)
+    if "error" not in result and not result["chunks"]["failed"]:
+        LLM_CACHE.set(text, result)
+    return result
+
+def _llm_cached(text: str):
+    cached = LLM_CACHE.get(text)
+    if cached is not None:
+        return cached
+    if LLM_BATCHER is not None and len(text) <= LLM_BATCH_MAX_CHARS:
+        result = LLM_BATCHER.submit(text).result()
+    else:
+        result = _openai_request(text)
+    # Failed calls are not cached so the next submission retries.
+    if "error" not in result:
+        LLM_CACHE.set(text, result)
+    return result
+
+def _llm_map_reduce(text: str):
+    chunks = chunk_sentences(SCANNER.sentences(text), LLM_CHUNK_TOKENS)
+    return llm_analyze_flagged(flag_chunks(SCANNER, chunks), len(chunks))
+
+def _chunk_pool():
+    global _CHUNK_POOL
+    with _CHUNK_POOL_LOCK:
+        if _CHUNK_POOL is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _CHUNK_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("CADRA_LLM_CONCURRENCY", "4")),
+                                             thread_name_prefix="cadra-llm-chunk")
+        return _CHUNK_POOL
+
+def llm_analyze_flagged(flagged, total):
+    """
+    Sends flagged chunks, [(index, text, hits)] out of total, to the LLM
+    concurrently and merges the answers. Chunks seen before come from
+    LLM_CACHE. None when no LLM is configured.
     """
-    if not OPENAI_AVAILABLE or not OPENAI_KEY:
+    if LLM_CLIENT is None:
         return None
+    # Most-flagged chunks first when there are more than LLM_MAX_CHUNKS.
+    flagged = sorted(flagged, key=lambda f: -f[2])[:LLM_MAX_CHUNKS]
+    pool = _chunk_pool()
+    futures = [(i, pool.submit(_llm_cached, chunk)) for i, chunk, _ in flagged]
+    return merge_results([(i, f.result()) for i, f in futures], total)
 
+SYSTEM_PROMPT = (
+    "You are Document Safety Assistant. Analyze the provided document and return a JSON "
+    "with fields: 'summary' (1-2 sentence), 'issues' (list of short strings), "
+    "'rewrite_suggestions' (list of up to 3 suggested rewrites), "
+    "'advice' (list of concrete actions). Only return valid JSON."
+)
+BATCH_SYSTEM_PROMPT = (
+    "You are Document Safety Assistant. Analyze each of the provided documents on its own and "
+    "return a JSON object {\"results\": [...]} with one entry per document, in order. Each entry "
+    "has fields: 'summary' (1-2 sentence), 'issues' (list of short strings), "
+    "'rewrite_suggestions' (list of up to 3 suggested rewrites), "
+    "'advice' (list of concrete actions). Only return valid JSON."
+)
+LLM_MAX_TOKENS = 450
+
+def _escape(text: str):
     # Escape text to avoid breaking prompt
-    safe_text = (
+    return (
         text.replace('\\', '\\\\')
             .replace('{', '{{')
             .replace('}', '}}')
     )
 
-    system_prompt = (
-        "You are Document Safety Assistant. Analyze the provided document and return a JSON "
-        "with fields: 'summary' (1-2 sentence), 'issues' (list of short strings), "
-        "'rewrite_suggestions' (list of up to 3 suggested rewrites), "
-        "'advice' (list of concrete actions). Only return valid JSON."
-    )
-
-    user_prompt = "Document:\n'''{}'''\nProvide result as JSON.".format(safe_text)
-
+def _parse_llm_json(txt: str):
     try:
-        if hasattr(openai, "ChatCompletion"):
-            resp = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.2,
-                max_tokens=450
-            )
-            txt = resp['choices'][0]['message']['content']
-        else:
-            resp = openai.Completion.create(
-                model="gpt-4o",
-                prompt=system_prompt + "\n\n" + user_prompt,
-                temperature=0.2,
-                max_tokens=450
-            )
-            txt = resp['choices'][0]['text']
-
-        # Parse JSON from response
-        try:
-            jtxt = txt.strip()
-            start = jtxt.find('{')
-            end = jtxt.rfind('}')
-            if start != -1 and end != -1:
-                return json.loads(jtxt[start:end + 1])
-            return {"raw": txt}
-        except:
-            return {"raw": txt}
+        jtxt = txt.strip()
+        start = jtxt.find('{')
+        end = jtxt.rfind('}')
+        if start != -1 and end != -1:
+            return json.loads(jtxt[start:end + 1])
+        return {"raw": txt}
+    except:
+        return {"raw": txt}
 
+def _openai_request(text: str):
+    user_prompt = "Document:\n'''{}'''\nProvide result as JSON.".format(_escape(text))
+    try:
+        txt = LLM_CLIENT.chat(
+            [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.2,
+            max_tokens=LLM_MAX_TOKENS
+        )
     except Exception as e:
         return {"error": f"LLM call failed: {str(e)}"}
-def llm_analyze_fallback(text: str):
-    sensitive = find_sensitive_items(text)
-    tone = simple_tone_and_toxicity(text)
-    struct = structure_and_clarity(text)
-    pl = plagiarism_hint(text)
-    issues = []
-    if sensitive['emails'] or sensitive['phones'] or sensitive['aadhar_like'] or sensitive['long_numbers']:
-        issues.append("Contains potential personally identifiable information (PII).")
-    if tone['toxic_hits']:
-        issues.append("Contains toxic or insulting language.")
-    if tone['suspicious_hits']:
-        issues.append("Contains suspicious phrases (payment/login/request).")
-    if pl['template_hits']:
-        issues.append("Contains common template phrases; check originality.")
-    if struct['long_sentences_count']>0:
-        issues.append("Contains very long sentences; consider breaking for clarity.")
-    summary = "The document has " + (", ".join(issues) if issues else "no immediate obvious red flags.")
-    rewrites = []
-    if sensitive['phones']:
-        rewrites.append("Remove phone numbers or redact them like +91-XXXXXXXXXX.")
-    if tone['toxic_hits']:
-        rewrites.append("Replace insulting phrases with neutral language.")
-    if not rewrites:
-        rewrites.append("Document appears generally fine; improve clarity if needed.")
-    advice = [
-        "Redact any PII before publishing.",
-        "Use neutral tone; avoid accusatory language.",
-        "Break long sentences; add citations where needed."
-    ]
-    return {"summary": summary, "issues": issues, "rewrite_suggestions": rewrites, "advice": advice}
-
-def analyze(text: str):
-    s = find_sensitive_items(text)
-    tone = simple_tone_and_toxicity(text)
-    struct = structure_and_clarity(text)
-    pl = plagiarism_hint(text)
-    score = 0
-    if s['emails']: score += 20
-    if s['phones']: score += 20
-    if s['aadhar_like'] or s['long_numbers']: score += 25
-    score += min(20, len(tone['suspicious_hits'])*6)
-    score += min(20, len(tone['toxic_hits'])*12)
-    score += max(0, (50 - tone['tone_score'])//2)
-    score += min(10, struct['long_sentences_count']*3)
-    score += min(10, len(pl['template_hits'])*5)
-    score = int(max(0, min(100, score)))
-    llm_result = None
-    if OPENAI_AVAILABLE and OPENAI_KEY:
-        llm_out = llm_analyze_openai(text)
+    return _parse_llm_json(txt)
+
+def _openai_request_batch(texts):
+    """
+    One LLM call for several short documents; falls back to one call per
+    document if the reply does not hold one result for each.
+    """
+    if len(texts) == 1:
+        return [_openai_request(texts[0])]
+    user_prompt = "\n\n".join(
+        "### Document {}\n'''{}'''".format(i, _escape(t)) for i, t in enumerate(texts, 1)
+    ) + "\n\nProvide the results as JSON."
+    try:
+        txt = LLM_CLIENT.chat(
+            [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.2,
+            max_tokens=LLM_MAX_TOKENS * len(texts)
+        )
+    except Exception as e:
+        return [{"error": f"LLM call failed: {str(e)}"} for _ in texts]
+    results = _parse_llm_json(txt).get("results")
+    if not isinstance(results, list) or len(results) != len(texts) \
+            or not all(isinstance(r, dict) for r in results):
+        return [_openai_request(t) for t in texts]
+    return results
+
+LLM_BATCHER = (MicroBatcher(_openai_request_batch, LLM_BATCH_SIZE)
+               if LLM_CLIENT is not None and LLM_BATCH_SIZE > 1 else None)
+
+def llm_analyze_fallback(text: str, analysis=None):
+    """
+    Heuristic report used when no LLM is configured. Pass the document's
+    Analysis to reuse detector results that were already computed.
+    """
+    if analysis is None:
+        analysis = Analysis(text, SCANNER)
+    return analysis.fallback
+
+def llm_enabled():
+    return LLM_CLIENT is not None
+
+# Score at which a document is High risk; the default triage threshold.
+HIGH_RISK_SCORE = 61
+
+def run_stateful(report, text: str, detectors, doc_id=None, timings=None):
+    """
+    Runs stateful detectors (detectors.split) for text and returns report
+    with their sections added; report holds those of the cacheable ones.
+    """
+    sections = {d.section: report[d.section] for d in DETECTORS.values() if d.section in report}
+    a = Analysis(text, SCANNER, timings, [], doc_id)
+    new = a.run_more(detectors, sections)
+    # Sections in registration order, as Analysis.report() writes them.
+    out = {k: report.pop(k) for k in ("score", "risk_level", "evidence")}
+    for d in DETECTORS.values():
+        if d.section in new:
+            out[d.section] = new[d.section]
+        elif d.section in report:
+            out[d.section] = report.pop(d.section)
+    out.update(report)
+    return out
+
+def analyze(text: str, llm=True, cache=True, timings=None, detectors=None, triage=None,
+            doc_id=None, stateful=True):
+    """
+    llm=False skips the remote model call and leaves report['llm'] as None
+    so the caller can run it in the background; the key-less fallback is
+    cheap and always filled in. cache=False bypasses REPORT_CACHE, for
+    one-off bulk runs that would only churn it.
+
+    detectors: names (list or "pii,tone") to run instead of the default
+    detectors; the report then carries only their sections. Unknown names
+    raise detectors.UnknownDetector. Stateful ones ("similar") run on every
+    call, outside REPORT_CACHE; doc_id is the id they record the document
+    under. stateful=False leaves them out (batch.py runs them itself).
+
+    timings: True/False to force stage timing on or off (default
+    CADRA_TIMINGS), or a metrics.Timings to record into. When on, the
+    report gains a 'timings' section.
+
+    triage: a score threshold (True for HIGH_RISK_SCORE). Detectors then
+    run cheapest first and stop once the score is certain to end at or
+    above the threshold, or below it (Analysis.triage); after such an early
+    exit the LLM is not called either. The report carries only the
+    sections that ran, so its score is a lower bound, plus a 'triage'
+    section: {"threshold", "above": the outcome, "early_exit": whether a
+    scoring detector was skipped, "skipped": detector names and "llm" when
+    skipped}. Stateful and other non-scoring detectors are always skipped.
+    """
+    if timings is None:
+        timings = TIMINGS_ENABLED
+    t = timings if isinstance(timings, Timings) else (Timings() if timings else None)
+    if triage is True:
+        triage = HIGH_RISK_SCORE
+    planned, later = split(plan(detectors))
+    variant = signature(planned)
+    if triage is not None:
+        variant += f";triage={triage}"
+    with timed(t, "cache"):
+        report = REPORT_CACHE.get(text, variant) if cache else None
+    if report is None:
+        a = Analysis(text, SCANNER, t, planned)
+        if triage is not None:
+            skipped, early = a.triage(triage)
+        report = a.report(None if llm_enabled() else llm_analyze_fallback(text, a))
+        if triage is not None:
+            report["triage"] = {"threshold": triage, "above": a.score >= triage,
+                                "early_exit": early, "skipped": skipped}
+        if cache:
+            with timed(t, "cache"):
+                REPORT_CACHE.set(text, report, variant)
+    if triage is not None:
+        report["triage"]["skipped"] += [d.name for d in later]
+    elif later and stateful:
+        report = run_stateful(report, text, later, doc_id, t)
+    if triage is not None and report["triage"]["early_exit"]:
+        if llm and llm_enabled():
+            report["triage"]["skipped"].append("llm")
+        llm = False
+    if llm and llm_enabled():
+        with timed(t, "llm"):
+            llm_out = llm_analyze_openai(text)
         if llm_out:
-            llm_result = llm_out
-    else:
-        llm_result = llm_analyze_fallback(text)
-    evidence = []
-    if s['emails']: evidence.append(f"Emails found: {len(s['emails'])}")
-    if s['phones']: evidence.append(f"Phone numbers found: {len(s['phones'])}")
-    if s['urls']: evidence.append(f"URLs found: {len(s['urls'])}")
-    if tone['toxic_hits']: evidence.append(f"Toxic words: {', '.join(tone['toxic_hits'])}")
-    if tone['suspicious_hits']: evidence.append(f"Suspicious phrases: {', '.join(tone['suspicious_hits'])}")
-    if pl['template_hits']: evidence.append(f"Common templates matched: {', '.join(pl['template_hits'])}")
-    report = {
-        "score": score,
-        "risk_level": ("High" if score>=61 else "Medium" if score>=31 else "Low"),
-        "evidence": evidence,
-        "sensitive": s,
-        "tone": tone,
-        "structure": struct,
-        "plagiarism_hint": pl,
-        "llm": llm_result
-    }
+            report["llm"] = llm_out
+    if t is not None:
+        report["timings"] = t.as_dict()
     return report
@@ -0,0 +1,139 @@
+"""
+Detector registry.
+
+A detector fills one report section from a pipeline.Analysis. Callers can
+ask for a subset, e.g. analyze(text, detectors="pii,tone"). The planner then
+runs only those detectors plus their dependencies. Since Analysis stages
+are lazy, the intermediates that only unrequested detectors need (tokens,
+sentences, phrase hits) are never computed.
+
+Extra detectors register a "module:function" target, which is imported on
+first use; the function takes the Analysis and returns its section:
+
+    register("language", "mypkg.lang:detect", version="2", cost=3)
+
+A detector that requires others can read their output from
+analysis.sections.
+
+Stateful detectors depend on more than the text (e.g. an index of the
+documents analyzed before). They only run when asked for by name, and
+their sections, like those of detectors requiring them, are never cached.
+"""
+import importlib
+from operator import attrgetter
+
+
+class UnknownDetector(ValueError):
+    pass
+
+
+class Detector:
+    def __init__(self, name, target, section=None, version="1", cost=1, requires=(), stateful=False):
+        """
+        target: callable(analysis) or a lazily imported "module:function".
+        section: report key for the output (default: name).
+        cost: relative cost hint; cheaper detectors run first.
+        requires: names of detectors whose sections this one reads.
+        stateful: output depends on more than the text (see above).
+        """
+        self.name = name
+        self.section = section or name
+        self.version = version
+        self.cost = cost
+        self.requires = tuple(requires)
+        self.stateful = stateful
+        self._target = target
+        self._fn = target if callable(target) else None
+
+    def run(self, analysis):
+        if self._fn is None:
+            module, _, attr = self._target.partition(":")
+            self._fn = getattr(importlib.import_module(module), attr)
+        return self._fn(analysis)
+
+
+DETECTORS = {}
+
+
+def register(name, target, section=None, version="1", cost=1, requires=(), stateful=False):
+    DETECTORS[name] = Detector(name, target, section, version, cost, requires, stateful)
+    return DETECTORS[name]
+
+
+# Built-ins read the Analysis stage of the same output; costs are rough
+# relative timings on English prose.
+register("pii", attrgetter("sensitive"), section="sensitive", cost=1)
+register("tone", attrgetter("tone"), cost=2)
+register("structure", attrgetter("structure"), cost=4)
+register("plagiarism", attrgetter("plagiarism"), section="plagiarism_hint", cost=3)
+
+# Compares the document with those analyzed before (MinHash/LSH, see
+# neardup.py), then indexes it. Opt-in: detectors="...,similar".
+register("similar", "neardup:similar", section="similar_documents", cost=5, stateful=True)
+
+# The text-only detectors; streamed and incrementally combined reports
+# carry just these.
+BUILTIN = ("pii", "tone", "structure", "plagiarism")
+
+
+def parse(spec):
+    """
+    Turns "pii,tone" (or a list of names) into a list of names; None and
+    empty mean the default detectors (all but the stateful ones).
+    """
+    if not spec:
+        return None
+    if isinstance(spec, str):
+        spec = spec.split(",")
+    names = [s.strip() for s in spec if s.strip()]
+    unknown = [n for n in names if n not in DETECTORS]
+    if unknown:
+        raise UnknownDetector("unknown detectors: " + ", ".join(unknown))
+    return names or None
+
+
+def plan(names=None):
+    """
+    Returns the Detectors to run for names (default: all registered but
+    the stateful ones), dependencies before dependents, otherwise cheapest
+    first.
+    """
+    names = parse(names) or [name for name, d in DETECTORS.items() if not d.stateful]
+    ordered = []
+    seen = set()
+
+    def visit(name, path):
+        if name in seen:
+            return
+        if name in path:
+            raise ValueError("detector dependency cycle: " + " -> ".join(path + (name,)))
+        if name not in DETECTORS:
+            raise UnknownDetector(f"unknown detector: {name}")
+        d = DETECTORS[name]
+        for dep in sorted(d.requires, key=lambda n: DETECTORS[n].cost if n in DETECTORS else 0):
+            visit(dep, path + (name,))
+        seen.add(name)
+        ordered.append(d)
+
+    for name in sorted(names, key=lambda n: DETECTORS[n].cost):
+        visit(name, ())
+    return ordered
+
+
+def split(detectors):
+    """
+    Splits planned detectors into (cacheable, stateful), the latter being
+    the stateful ones and those requiring one; both keep plan order.
+    """
+    stateful = set()
+    for d in detectors:
+        if d.stateful or stateful.intersection(d.requires):
+            stateful.add(d.name)
+    return [d for d in detectors if d.name not in stateful], [d for d in detectors if d.name in stateful]
+
+
+def signature(detectors):
+    """
+    Cache-key component naming the planned detectors and their versions.
+    """
+    return ",".join(sorted(f"{d.name}@{d.version}" for d in detectors))
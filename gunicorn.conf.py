@@ -0,0 +1,55 @@
+"""
+gunicorn settings for serving CADRA in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment (CADRA_*) or on the
+gunicorn command line.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("CADRA_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("CADRA_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+# Threads let a worker keep serving while one of its requests waits on I/O.
+worker_class = "gthread"
+threads = int(os.getenv("CADRA_THREADS", "4"))
+
+# Import the app (and build the detector tables) once in the master, so
+# workers share those pages copy-on-write. See wsgi.py.
+preload_app = True
+
+# Recycle each worker after a jittered number of requests, so a slow leak
+# or fragmented heap never grows without bound and workers do not all
+# restart at once.
+max_requests = int(os.getenv("CADRA_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("CADRA_MAX_REQUESTS_JITTER", "200"))
+
+# Request limits. Bodies are capped by the app (CADRA_MAX_TEXT_KB for
+# pasted text, CADRA_MAX_UPLOAD_MB for uploads); these cap the header part.
+limit_request_line = 4094
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# A worker silent for this long is killed and replaced. On SIGTERM,
+# workers stop accepting and get graceful_timeout seconds to finish.
+timeout = int(os.getenv("CADRA_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("CADRA_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = os.getenv("CADRA_ACCESS_LOG", "-") or None
+
+# LLM job state must be visible to every worker, since the result page may
+# poll a different one than the worker that ran the job. It holds the LLM
+# analyses of submitted documents, so it goes in a private state directory.
+if not os.getenv("CADRA_JOBS_PATH"):
+    state_dir = os.getenv("CADRA_STATE_DIR") or os.path.join(
+        os.getenv("XDG_STATE_HOME") or os.path.expanduser("~/.local/state"), "cadra")
+    os.makedirs(state_dir, mode=0o700, exist_ok=True)
+    os.chmod(state_dir, 0o700)
+    os.environ["CADRA_JOBS_PATH"] = os.path.join(state_dir, "jobs.sqlite")
+
+
+def worker_exit(server, worker):
+    from wsgi import shutdown
+    shutdown()
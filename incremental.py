@@ -0,0 +1,193 @@
+"""
+Revision-aware analysis for documents that are edited and resubmitted.
+
+The client names each document with an ID. Every paragraph (text between
+blank lines) is scanned on its own, and its detector state is kept under
+the hash of its content. A new revision only scans paragraphs whose hash
+the previous revision did not have, then combines all the per-paragraph
+states into the document report. The LLM pass likewise only sends flagged
+paragraphs it has not seen before; the rest come from LLM_CACHE.
+
+The combined report equals analyze() on the whole text, except for the
+rare match that spans a blank line (only the \\s* in the Aadhaar pattern
+can).
+"""
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from detector import SCANNER, llm_analyze_flagged, llm_enabled
+from pipeline import Analysis
+from scanner import LONG_SENTENCE_WORDS, SENSITIVE_KEYS, dedupe
+from stream import SentenceStats
+
+RE_PARAGRAPH = re.compile(r"\n\s*\n")
+DEFAULT_MAX_DOCUMENTS = 256
+
+
+def split_paragraphs(text: str):
+    return [p for p in map(str.strip, RE_PARAGRAPH.split(text)) if p]
+
+
+def _hash(paragraph):
+    return hashlib.blake2b(paragraph.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class ParagraphState:
+    __slots__ = ("sensitive", "phrases", "exclam", "questions", "caps",
+                 "word_count", "word_chars", "terms", "head", "inner", "tail", "closed", "hits")
+
+    def __init__(self, scanner, text):
+        p = scanner.patterns
+        low = text.lower()
+        words = p["word"].findall(text)
+        self.sensitive = scanner.sensitive(text)
+        self.phrases = scanner.matcher.hits(low)
+        self.exclam = text.count("!")
+        self.questions = text.count("?")
+        self.caps = len(p["caps"].findall(text))
+        self.word_count = len(words)
+        self.word_chars = sum(map(len, words))
+        self.terms = scanner.term_counts(low)
+        # Word counts of the sentence pieces. The first (head) continues the
+        # previous paragraph's open sentence, the last (tail) stays open
+        # unless the paragraph ends one; those between are summed up front.
+        pieces = list(map(len, map(str.split, p["sentence_split"].split(text))))
+        inner = pieces[1:-1]
+        self.head = pieces[0]
+        self.tail = pieces[-1] if len(pieces) > 1 else None
+        self.inner = (len(inner), sum(inner), sum(1 for n in inner if n > LONG_SENTENCE_WORDS))
+        self.closed = text[-1] in ".!?"
+        hit_groups = scanner.group_hits(self.phrases)
+        self.hits = (sum(map(len, self.sensitive.values()))
+                     + len(hit_groups["toxic"]) + len(hit_groups["suspicious"]))
+
+
+class Revision:
+    def __init__(self, doc_id, number, paragraphs, states, changed, scanner):
+        self.doc_id = doc_id
+        self.number = number
+        self.paragraphs = paragraphs
+        self.states = states
+        self.changed = changed
+        self.scanner = scanner
+
+    def analysis(self):
+        """
+        The document's Analysis, combined from the paragraph states.
+        """
+        sc = self.scanner
+        sensitive = {key: [] for key, _ in SENSITIVE_KEYS}
+        found = set()
+        exclam = questions = caps = word_count = word_chars = 0
+        terms = Counter()
+        sentences = SentenceStats()
+        for st in self.states:
+            for key, items in st.sensitive.items():
+                sensitive[key].extend(items)
+            found.update(st.phrases)
+            exclam += st.exclam
+            questions += st.questions
+            caps += st.caps
+            word_count += st.word_count
+            word_chars += st.word_chars
+            terms.update(st.terms)
+            sentences.extend(st.head)
+            if st.tail is not None:
+                sentences.close()
+                sentences.add_closed(*st.inner)
+                sentences.extend(st.tail)
+            if st.closed:
+                sentences.close()
+        sentences.close()
+        phrase_hits = sc.group_hits(found)
+        return Analysis.from_sections(
+            sc,
+            sensitive={k: dedupe(v) for k, v in sensitive.items()},
+            tone=sc.tone_from_counts(phrase_hits, exclam, caps, questions),
+            structure=sc.structure_from_counts(
+                sentences.num_sentences, sentences.sentence_words, sentences.long_sentences,
+                word_count, word_chars
+            ),
+            plagiarism=sc.plagiarism(phrase_hits, terms),
+        )
+
+    def flagged(self):
+        """
+        [(index, paragraph, hits)] for paragraphs with heuristic hits.
+        """
+        return [(i, p, st.hits) for i, (p, st) in enumerate(zip(self.paragraphs, self.states)) if st.hits]
+
+    def llm(self):
+        """
+        Merged LLM answer over the flagged paragraphs; only paragraphs not
+        sent before cost a model call. None when no LLM is configured.
+        """
+        return llm_analyze_flagged(self.flagged(), len(self.paragraphs))
+
+    def report(self, llm_result=None, detectors=None):
+        """
+        detectors: a detectors.plan() of built-in detectors to limit the
+        report to (default: all of them).
+        """
+        a = self.analysis()
+        if detectors is not None:
+            a.detectors = detectors
+        report = a.report(None if llm_enabled() else a.fallback)
+        if llm_result:
+            report["llm"] = llm_result
+        report["revision"] = {
+            "doc_id": self.doc_id,
+            "number": self.number,
+            "paragraphs": len(self.paragraphs),
+            "changed": self.changed,
+        }
+        return report
+
+
+class IncrementalAnalyzer:
+    def __init__(self, scanner=SCANNER, max_documents=DEFAULT_MAX_DOCUMENTS):
+        """
+        max_documents: documents whose paragraph states are kept (LRU).
+        """
+        self.scanner = scanner
+        self.max_documents = max_documents
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, doc_id, text: str):
+        """
+        Records a new revision of doc_id and returns it. Only paragraphs
+        the previous revision did not contain are scanned.
+        """
+        paragraphs = split_paragraphs(text)
+        hashes = [_hash(p) for p in paragraphs]
+        with self._lock:
+            prev_states, number = self._docs.pop(doc_id, ({}, 0))
+        states = []
+        changed = []
+        for i, (p, h) in enumerate(zip(paragraphs, hashes)):
+            st = prev_states.get(h)
+            if st is None:
+                st = ParagraphState(self.scanner, p)
+                changed.append(i)
+            states.append(st)
+        with self._lock:
+            # Only the current revision's paragraphs are kept.
+            self._docs[doc_id] = (dict(zip(hashes, states)), number + 1)
+            while len(self._docs) > self.max_documents:
+                self._docs.popitem(last=False)
+        return Revision(doc_id, number + 1, paragraphs, states, changed, self.scanner)
+
+    def analyze(self, doc_id, text: str, llm=True):
+        """
+        update() plus the report. llm=False leaves report['llm'] to the
+        caller (see Revision.llm()).
+        """
+        rev = self.update(doc_id, text)
+        return rev.report(rev.llm() if llm and llm_enabled() else None)
+
+    def forget(self, doc_id):
+        with self._lock:
+            self._docs.pop(doc_id, None)
@@ -0,0 +1,185 @@
+"""
+Memory-mapped file analysis.
+
+    python ingest.py FILE [FILE ...]
+
+The file is mmap'ed read-only and the detectors run bytes-mode patterns
+straight over the mapping, so the document is never decoded or copied as a
+whole; only matches are materialized. Token-level detectors walk the map in
+slices cut at whitespace, which keeps their per-slice match lists small.
+Sentence splitting and phrase matching need a real bytes object, so they
+work on one transient copy of the current slice at a time.
+
+Bytes patterns treat \\w, \\d and \\s as ASCII classes. Results equal
+analyze() for ASCII text; for other UTF-8 text, word and term statistics
+only see ASCII word runs.
+"""
+import json
+import mmap
+import re
+import sys
+from collections import Counter
+
+from detector import SCANNER, analyze, llm_enabled
+from pii import RunStartPattern
+from pipeline import Analysis
+from scanner import SENSITIVE_KEYS
+from stream import SentenceStats
+
+DEFAULT_SLICE = 4 << 20
+RE_SPACE = re.compile(rb"\s")
+RE_DIGIT = re.compile(rb"\d")
+RE_BANG = re.compile(rb"!")
+RE_QUESTION = re.compile(rb"\?")
+
+
+def _to_bytes(regex):
+    if isinstance(regex, RunStartPattern):
+        return regex.to_bytes()
+    return re.compile(regex.pattern.encode("utf-8"), regex.flags & ~re.UNICODE)
+
+
+def _phrase_regex(phrase):
+    pat = re.escape(phrase.encode("utf-8"))
+    if re.match(r"\w", phrase[0]):
+        pat = rb"(?<!\w)" + pat
+    if re.match(r"\w", phrase[-1]):
+        pat = pat + rb"(?!\w)"
+    return re.compile(pat)
+
+
+def _decode(items):
+    return [b.decode("utf-8", "replace") for b in items]
+
+
+class MappedScanner:
+    def __init__(self, scanner=SCANNER, slice_size=DEFAULT_SLICE):
+        self.scanner = scanner
+        self.slice_size = slice_size
+        self.patterns = {name: _to_bytes(p) for name, p in scanner.patterns.items()}
+        self.word_boundary = scanner.matcher.word_boundary
+        self.phrases = [(p, p.encode("utf-8"), _phrase_regex(p)) for p in scanner.matcher.phrases]
+        self.max_phrase = max((len(b) for _, b, _ in self.phrases), default=0)
+
+    def _slices(self, buf):
+        """
+        Yields (start, end) ranges of about slice_size bytes, each ending at
+        whitespace so no token, word or caps run straddles two slices.
+        """
+        n = len(buf)
+        start = 0
+        while start < n:
+            end = start + self.slice_size
+            if end >= n:
+                end = n
+            else:
+                m = RE_SPACE.search(buf, end)
+                end = m.start() if m else n
+            yield start, end
+            start = end
+
+    def _phrase_hits(self, low, pos, found):
+        for p, pb, rx in self.phrases:
+            if p in found:
+                continue
+            if self.word_boundary:
+                if rx.search(low, pos):
+                    found.add(p)
+            elif low.find(pb, pos) != -1:
+                found.add(p)
+
+    def sensitive(self, buf):
+        p = self.patterns
+        has_digit = RE_DIGIT.search(buf) is not None
+        has_url = buf.find(b"http") != -1 or buf.find(b"www.") != -1
+        possible = {"email": buf.find(b"@") != -1, "url": has_url}
+        found = {}
+        for key, name in SENSITIVE_KEYS:
+            if possible.get(name, has_digit):
+                found[key] = list(dict.fromkeys(_decode(p[name].findall(buf))))
+            else:
+                found[key] = []
+        return found
+
+    def analyze(self, buf):
+        """
+        Runs every detector over a bytes-like buffer (bytes or mmap) and
+        returns the document's Analysis.
+        """
+        sc, p = self.scanner, self.patterns
+        exclam = questions = caps = word_count = word_chars = 0
+        raw_terms = Counter()
+        sentences = SentenceStats()
+        found = set()
+        split = p["sentence_split"]
+        for start, end in self._slices(buf):
+            exclam += len(RE_BANG.findall(buf, start, end))
+            questions += len(RE_QUESTION.findall(buf, start, end))
+            caps += len(p["caps"].findall(buf, start, end))
+            words = p["word"].findall(buf, start, end)
+            word_count += len(words)
+            word_chars += sum(map(len, words))
+            raw_terms.update(p["term"].findall(buf, start, end))
+
+            chunk = buf[start:end]
+            # The first piece continues the sentence left open by the
+            # previous slice; a slice ending in . ! or ? closes its last one.
+            lens = list(map(len, map(bytes.split, split.split(chunk))))
+            sentences.extend(lens[0])
+            for n in lens[1:]:
+                sentences.close()
+                sentences.extend(n)
+            if chunk.rstrip()[-1:] in (b".", b"!", b"?"):
+                sentences.close()
+
+            # Lowercase with enough of the previous slice in front to catch
+            # phrases that straddle the cut, plus one byte of left context.
+            lo = max(0, start - self.max_phrase)
+            low = buf[lo:end].lower()
+            self._phrase_hits(low, 1 if lo else 0, found)
+            del chunk, low
+        sentences.close()
+        # Fold case after counting, over distinct terms only. Keys keep
+        # first-occurrence order, as Counter over the lowered text would.
+        term_counts = Counter()
+        for t, n in raw_terms.items():
+            term_counts[t.lower().decode("utf-8", "replace")] += n
+        phrase_hits = sc.group_hits(found)
+        return Analysis.from_sections(
+            sc,
+            sensitive=self.sensitive(buf),
+            tone=sc.tone_from_counts(phrase_hits, exclam, caps, questions),
+            structure=sc.structure_from_counts(
+                sentences.num_sentences, sentences.sentence_words, sentences.long_sentences,
+                word_count, word_chars
+            ),
+            plagiarism=sc.plagiarism(phrase_hits, term_counts),
+        )
+
+
+MAPPED_SCANNER = MappedScanner()
+
+
+def analyze_mapped(path):
+    """
+    Analyzes a file through a read-only memory map. Heuristics only; the
+    LLM section carries the fallback when no LLM is configured.
+    """
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return analyze("", llm=False, cache=False)
+        with mm:
+            a = MAPPED_SCANNER.analyze(mm)
+            return a.report(None if llm_enabled() else a.fallback)
+
+
+def main(argv=None):
+    for path in (argv if argv is not None else sys.argv[1:]):
+        print(json.dumps({"id": path, "report": analyze_mapped(path)}, separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Bounded background executor for slow LLM enrichment.
+
+The web request returns the heuristic report straight away and hands the
+model call to a JobStore; the page then polls /jobs/<id> for the result.
+Under a preforking server the poll may reach another worker, so a store
+given a sqlite path also records job state there for its siblings.
+
+sqlite3 is imported when a path is given and concurrent.futures on the
+first submit(), so importing app does not load them.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    def __init__(self, max_workers=4, max_pending=64, ttl=600, path=None):
+        """
+        max_workers: concurrent LLM calls.
+        max_pending: queued plus running jobs before submit() refuses work.
+        ttl: seconds a finished job's result is kept for polling.
+        path: sqlite file shared by the worker processes; None keeps jobs
+        in this process only. It holds LLM results, so it is created with
+        mode 0600, and one owned by another user is refused.
+        """
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._executor = None
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._path = path
+        self._db = None
+        if path:
+            self._open()
+            os.register_at_fork(after_in_child=self._open)
+
+    def _open(self):
+        import sqlite3
+        self._lock = threading.Lock()
+        # Created private before sqlite opens it; chmod also tightens a file
+        # left by an earlier version and fails on someone else's.
+        os.close(os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self._path, 0o600)
+        self._db = sqlite3.connect(self._path, timeout=10, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, finished REAL)"
+        )
+        self._db.commit()
+
+    def _store(self, job):
+        # Called with self._lock held.
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, result, finished) VALUES (?, ?, ?, ?)",
+            (job["id"], job["status"], json.dumps(job["result"]),
+             time.time() if job["finished_at"] is not None else None)
+        )
+        self._db.commit()
+
+    def submit(self, fn, *args):
+        """
+        Schedules fn(*args) and returns its job id. Raises JobQueueFull when
+        max_pending jobs are already queued or running.
+        """
+        with self._lock:
+            self._evict_expired()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} LLM jobs already pending")
+            self._pending += 1
+            job_id = uuid.uuid4().hex
+            job = {"id": job_id, "status": "pending", "result": None, "finished_at": None}
+            self._jobs[job_id] = job
+            self._store(job)
+        future = self._pool().submit(fn, *args)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job_id
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="cadra-llm")
+            return self._executor
+
+    def _finish(self, job, future):
+        try:
+            result, status = future.result(), "done"
+        except Exception as e:
+            result, status = {"error": f"LLM call failed: {str(e)}"}, "error"
+        with self._lock:
+            job["result"] = result
+            job["status"] = status
+            job["finished_at"] = time.monotonic()
+            self._pending -= 1
+            self._store(job)
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl
+        expired = [jid for jid, job in self._jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+        if self._db is not None and expired:
+            self._db.execute("DELETE FROM jobs WHERE finished < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    def get(self, job_id):
+        """
+        Returns {'id', 'status', 'result'} for a known job, else None.
+        status is 'pending', 'done' or 'error'.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return {"id": job["id"], "status": job["status"], "result": job["result"]}
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT status, result, finished FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or (row[2] is not None and row[2] < time.time() - self.ttl):
+            return None
+        return {"id": job_id, "status": row[0], "result": json.loads(row[1])}
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
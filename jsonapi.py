@@ -0,0 +1,111 @@
+"""
+JSON encoding for the /api/v1 endpoints.
+
+dumps() uses orjson when it is installed and compact stdlib json
+otherwise. project() trims a report to the requested fields, and
+encode() compresses the body for clients that accept br or gzip (br needs
+the brotli package).
+"""
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed; the framing would eat
+# most of the saving.
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj):
+    """
+    Compact UTF-8 JSON bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_fields(spec):
+    """
+    "score,sensitive.emails,-llm" -> (include paths, exclude paths), each
+    path a tuple of keys. Empty include means everything.
+    """
+    include, exclude = [], []
+    for name in (spec or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name.startswith("-"):
+            exclude.append(tuple(name[1:].split(".")))
+        else:
+            include.append(tuple(name.split(".")))
+    return include, exclude
+
+
+def _pick(obj, paths):
+    if any(len(p) == 0 for p in paths) or not isinstance(obj, dict):
+        return obj
+    out = {}
+    for key in obj:
+        sub = [p[1:] for p in paths if p[0] == key]
+        if sub:
+            out[key] = _pick(obj[key], sub)
+    return out
+
+
+def _drop(obj, paths):
+    if not isinstance(obj, dict):
+        return obj
+    out = {}
+    for key, value in obj.items():
+        sub = [p[1:] for p in paths if p[0] == key]
+        if any(len(p) == 0 for p in sub):
+            continue
+        out[key] = _drop(value, sub) if sub else value
+    return out
+
+
+def project(report, spec):
+    """
+    Keeps only the fields named in spec (dotted paths reach into
+    sections) and drops those prefixed with '-'.
+    """
+    include, exclude = parse_fields(spec)
+    if include:
+        report = _pick(report, include)
+    if exclude:
+        report = _drop(report, exclude)
+    return report
+
+
+def encode(body, accept_encoding):
+    """
+    Returns (body, content encoding or None) for the client's
+    Accept-Encoding header.
+    """
+    if len(body) < MIN_COMPRESS_BYTES or not accept_encoding:
+        return body, None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, q = part.partition(";")
+        try:
+            weight = float(q.strip().partition("=")[2]) if q.strip().startswith("q=") else 1.0
+        except ValueError:
+            weight = 0.0
+        if weight > 0:
+            accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
@@ -0,0 +1,302 @@
+"""
+HTTP client for the chat-completions LLM backend.
+
+One LLMClient per process keeps a pool of keep-alive connections and caps
+concurrent calls with a semaphore. A token bucket paces calls. Connection
+errors, 429s and 5xx responses are retried with jittered exponential
+backoff, all within a per-call deadline. The client speaks the OpenAI chat
+completions wire format over http.client, so CADRA_LLM_BASE_URL can point
+it at any compatible server, including llm_mock.py.
+
+MicroBatcher groups concurrent short requests into one backend call.
+
+http.client (with ssl and email) and concurrent.futures are imported when
+the first client or batcher is built, not with this module, so processes
+without an LLM configured never load them.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import LLM_ATTEMPTS
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """
+        rate: tokens per second; 0 or less disables limiting.
+        burst: bucket size (default: max(1, rate)).
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """
+        Takes one token, sleeping until one is available. Raises LLMTimeout
+        if that would pass deadline (a time.monotonic() value).
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise LLMTimeout("rate limit wait exceeds the call deadline")
+            time.sleep(wait)
+
+
+class ConnectionPool:
+    def __init__(self, base_url, size=4):
+        """
+        Keeps up to size idle keep-alive connections to base_url's host.
+        """
+        import http.client
+        from urllib.parse import urlsplit
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self._cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        # What a failed request on one of these connections can raise.
+        self.errors = (OSError, http.client.HTTPException)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.size = size
+        self._idle = queue.LifoQueue()
+        # A forked child must not reuse the parent's sockets; drop them
+        # there without closing (that would also affect the parent).
+        os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        self._idle = queue.LifoQueue()
+
+    def _new(self, timeout):
+        return self._cls(self.host, self.port, timeout=timeout)
+
+    @contextmanager
+    def connection(self, timeout):
+        """
+        Lends a connection; it goes back to the pool only if the block
+        finished without an exception.
+        """
+        try:
+            conn = self._idle.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        except queue.Empty:
+            conn = self._new(timeout)
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class LLMClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL, api_key=None, model="gpt-4o-mini",
+                 max_concurrency=4, rate=0, burst=None, timeout=30, deadline=60,
+                 max_retries=3, backoff=0.5, max_backoff=8):
+        """
+        max_concurrency: calls in flight at once; also the pool size.
+        rate, burst: token bucket for call starts per second (0: no limit).
+        timeout: socket timeout per attempt. deadline: seconds per call,
+        retries and backoff included.
+        backoff, max_backoff: base and cap of the full-jitter backoff.
+        """
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool = ConnectionPool(base_url, max_concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Client configured from OPENAI_API_KEY and the CADRA_LLM_* variables,
+        or None when neither a key nor a base URL is set.
+        """
+        key = os.getenv("OPENAI_API_KEY")
+        base_url = os.getenv("CADRA_LLM_BASE_URL")
+        if not key and not base_url:
+            return None
+        return cls(
+            base_url=base_url or DEFAULT_BASE_URL,
+            api_key=key,
+            model=os.getenv("CADRA_LLM_MODEL", "gpt-4o-mini"),
+            max_concurrency=int(os.getenv("CADRA_LLM_CONCURRENCY", "4")),
+            rate=float(os.getenv("CADRA_LLM_RATE", "0")),
+            timeout=float(os.getenv("CADRA_LLM_TIMEOUT", "30")),
+            deadline=float(os.getenv("CADRA_LLM_DEADLINE", "60")),
+            max_retries=int(os.getenv("CADRA_LLM_RETRIES", "3")),
+        )
+
+    def _send(self, path, body, timeout):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        with self.pool.connection(timeout) as conn:
+            conn.request("POST", self.pool.prefix + path, body, headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            if resp.will_close:
+                conn.close()
+            return resp.status, resp.headers, data
+
+    def post(self, path, payload, deadline=None):
+        """
+        POSTs payload as JSON and returns the decoded response. Raises
+        LLMTimeout past the deadline and LLMError on other failures.
+        """
+        deadline = deadline or time.monotonic() + self.deadline
+        body = json.dumps(payload).encode("utf-8")
+        attempt = 0
+        while True:
+            self.bucket.acquire(deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+                raise LLMTimeout("deadline passed waiting for a free LLM slot")
+            retry_after = None
+            try:
+                status, headers, data = self._send(path, body, min(self.timeout, remaining))
+            except self.pool.errors as e:
+                error = f"{type(e).__name__}: {e}"
+                LLM_ATTEMPTS.inc(1, "connection_error")
+            else:
+                if status < 300:
+                    LLM_ATTEMPTS.inc(1, "ok")
+                    try:
+                        return json.loads(data)
+                    except ValueError:
+                        raise LLMError("LLM backend returned invalid JSON")
+                LLM_ATTEMPTS.inc(1, str(status))
+                if status not in RETRY_STATUS:
+                    raise LLMError(f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}")
+                error = f"HTTP {status}"
+                retry_after = headers.get("Retry-After")
+            finally:
+                self._slots.release()
+            attempt += 1
+            if attempt > self.max_retries:
+                raise LLMError(f"giving up after {attempt} attempts: {error}")
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            try:
+                delay = max(delay, float(retry_after or 0))
+            except ValueError:
+                pass
+            if time.monotonic() + delay >= deadline:
+                raise LLMTimeout(f"deadline passed after {attempt} attempts: {error}")
+            time.sleep(delay)
+
+    def chat(self, messages, deadline=None, **params):
+        """
+        Runs one chat completion and returns the reply text.
+        """
+        payload = {"model": self.model, "messages": messages}
+        payload.update(params)
+        resp = self.post("/chat/completions", payload, deadline)
+        try:
+            return resp["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("malformed chat completion response")
+
+
+class MicroBatcher:
+    """
+    Groups items submitted close together into one fn(items) call, which
+    must return one result per item. A batch closes after max_wait seconds
+    or at max_batch items, and runs on its own thread, so several batches
+    can be in flight.
+    """
+    def __init__(self, fn, max_batch=8, max_wait=0.02):
+        from concurrent.futures import Future
+        self._future = Future
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._items = []
+        self._cond = threading.Condition()
+        self._start()
+        # Threads do not survive fork(): a preforked worker needs its own.
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._items = []
+        self._cond = threading.Condition()
+        threading.Thread(target=self._collect, name="cadra-llm-batcher", daemon=True).start()
+
+    def submit(self, item):
+        """
+        Returns a Future for item's result.
+        """
+        future = self._future()
+        with self._cond:
+            self._items.append((item, future))
+            self._cond.notify()
+        return future
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                closes = time.monotonic() + self.max_wait
+                while len(self._items) < self.max_batch:
+                    left = closes - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                batch = self._items[:self.max_batch]
+                self._items = self._items[self.max_batch:]
+            threading.Thread(target=self._dispatch, args=(batch,), daemon=True).start()
+
+    def _dispatch(self, batch):
+        try:
+            results = self.fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise LLMError(f"batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
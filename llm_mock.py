@@ -0,0 +1,144 @@
+"""
+Local stand-in for the chat-completions API, for exercising the LLM client.
+
+    python llm_mock.py --port 8099 --latency 0.2 --fail-rate 0.1
+    CADRA_LLM_BASE_URL=http://127.0.0.1:8099/v1 python app.py
+
+POST /v1/chat/completions answers with a canned analysis in the JSON shape
+the prompt asks for. A prompt with "### Document N" sections gets one
+result per section under "results". --fail-rate makes that share of calls
+fail with 503, and --rate-limit answers 429 (with Retry-After) once more
+than that many requests are in flight. GET /stats reports request,
+connection and failure counts.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RE_DOC = re.compile(r"^### Document (\d+)", re.M)
+
+
+def canned(doc):
+    return {
+        "summary": f"Mock analysis of {len(doc)} characters.",
+        "issues": [],
+        "rewrite_suggestions": [],
+        "advice": ["This answer came from llm_mock.py."],
+    }
+
+
+class MockState:
+    def __init__(self, latency=0.0, fail_rate=0.0, rate_limit=0, seed=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rate_limit = rate_limit
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {"requests": 0, "connections": 0, "failures": 0, "rate_limited": 0, "documents": 0}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, obj, headers=()):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.state.lock:
+                return self._reply(200, dict(self.state.stats))
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        st = self.state
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self._reply(404, {"error": "not found"})
+        with st.lock:
+            st.stats["requests"] += 1
+            limited = st.rate_limit and st.in_flight >= st.rate_limit
+            failed = not limited and st.rng.random() < st.fail_rate
+            if limited:
+                st.stats["rate_limited"] += 1
+            elif failed:
+                st.stats["failures"] += 1
+            else:
+                st.in_flight += 1
+        if limited:
+            return self._reply(429, {"error": "rate limited"}, [("Retry-After", "0.05")])
+        if failed:
+            return self._reply(503, {"error": "injected failure"})
+        try:
+            time.sleep(st.latency)
+            prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+            docs = RE_DOC.split(prompt)[2::2]
+            if docs:
+                content = {"results": [canned(d) for d in docs]}
+            else:
+                content = canned(prompt)
+            with st.lock:
+                st.stats["documents"] += max(1, len(docs))
+            self._reply(200, {
+                "id": "mock",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(content)}}],
+            })
+        finally:
+            with st.lock:
+                st.in_flight -= 1
+
+
+def make_server(host="127.0.0.1", port=0, **options):
+    """
+    Returns a ThreadingHTTPServer (not yet serving); port 0 picks a free
+    port, see server.server_address. Options go to MockState.
+    """
+    handler = type("MockHandler", (Handler,), {"state": MockState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock chat-completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per successful call")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of calls answered with 503")
+    parser.add_argument("--rate-limit", type=int, default=0, help="answer 429 beyond this many in-flight calls")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port, latency=args.latency, fail_rate=args.fail_rate,
+                         rate_limit=args.rate_limit, seed=args.seed)
+    print(f"mock LLM on http://{args.host}:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+HTTP load test for a running CADRA server.
+
+    python app.py                                    # dev server on :5000
+    gunicorn -c gunicorn.conf.py wsgi:app            # production on :8000
+    python loadtest.py http://127.0.0.1:5000 http://127.0.0.1:8000 --duration 20
+
+Each URL gets --clients keep-alive connections posting documents to
+/analyze for --duration seconds. Each result line shows requests/sec,
+latency percentiles and the error count. Later URLs are compared with the
+first. Documents come from bench.generate_document and are distinct per
+request (unless --repeat), so the report cache does not answer them.
+Client processes (--processes) keep the load generator itself from being
+the bottleneck.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from bench import generate_document, _percentile
+
+
+def _client(url, path, docs, deadline, out):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    i = 0
+    while time.monotonic() < deadline:
+        body = urlencode({"doc_text": docs[i % len(docs)]})
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body, headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+            if resp.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        out.append((time.perf_counter() - start, ok))
+    conn.close()
+
+
+def _process(args):
+    url, path, clients, size, seed, repeat, deadline = args
+    per_client = 1 if repeat else 64
+    results = []
+    threads = []
+    for c in range(clients):
+        docs = [generate_document(size, seed=seed + c * per_client + k) for k in range(per_client)]
+        out = []
+        results.append(out)
+        threads.append(threading.Thread(target=_client, args=(url, path, docs, deadline, out)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return [r for out in results for r in out]
+
+
+def run(url, path="/analyze", clients=16, processes=2, duration=10.0, size=2000, repeat=False, seed=0):
+    per_process = [clients // processes + (p < clients % processes) for p in range(processes)]
+    start = time.monotonic()
+    # Documents are generated before the clock starts counting.
+    deadline = start + duration + 1.0
+    jobs = [(url, path, n, size, seed + p * 100000, repeat, deadline) for p, n in enumerate(per_process) if n]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        samples = [s for part in pool.map(_process, jobs) for s in part]
+    elapsed = time.monotonic() - start - 1.0
+    lat = sorted(t for t, ok in samples if ok)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "url": url,
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(lat) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(_percentile(lat, 0.50) * 1000, 2) if lat else None,
+        "p95_ms": round(_percentile(lat, 0.95) * 1000, 2) if lat else None,
+        "p99_ms": round(_percentile(lat, 0.99) * 1000, 2) if lat else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test CADRA servers and compare requests/sec.")
+    parser.add_argument("urls", nargs="+", help="server base URLs; later ones are compared with the first")
+    parser.add_argument("--path", default="/analyze")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--processes", type=int, default=2, help="client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per URL")
+    parser.add_argument("--size", type=int, default=2000, help="document size in characters")
+    parser.add_argument("--repeat", action="store_true", help="resend one document per client (cache hits)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = []
+    for url in args.urls:
+        r = run(url.rstrip("/"), args.path, args.clients, args.processes, args.duration,
+                args.size, args.repeat, args.seed)
+        if results and results[0]["rps"]:
+            r["speedup"] = round(r["rps"] / results[0]["rps"], 2)
+        results.append(r)
+        print(f"{r['url']:<32} {r['rps']:>9.1f} req/s  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  "
+              f"p99 {r['p99_ms']} ms  errors {r['errors']}"
+              + (f"  x{r['speedup']}" if "speedup" in r else ""), flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
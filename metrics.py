@@ -0,0 +1,177 @@
+"""
+Per-stage timing and Prometheus-style metrics.
+
+Timings records wall and CPU time per pipeline stage for one document and
+feeds the same numbers into the process-wide REGISTRY, which /metrics
+renders in the Prometheus text exposition format.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    inner = ",".join('{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                     for n, v in zip(names, values))
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for lv, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, lv)} {v}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            counts = s[0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+            s[1] += 1
+            s[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for lv, (counts, count, total) in sorted(self._series.items()):
+                for b, c in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(names, lv + (b,))} {c}")
+                lines.append(f"{self.name}_bucket{_labels(names, lv + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, lv)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, lv)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        m = Counter(name, help, labels)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        m = Histogram(name, help, labels, buckets)
+        self._metrics.append(m)
+        return m
+
+    def collector(self, fn):
+        """
+        Registers fn() -> list of (name, type, help, [(labels_dict, value)])
+        for values owned elsewhere, e.g. cache counters. Usable as a decorator.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "cadra_stage_seconds", "Wall time per analysis stage (excluding nested stages).", ("stage",))
+STAGE_CPU_SECONDS = REGISTRY.counter(
+    "cadra_stage_cpu_seconds_total", "Thread CPU time per analysis stage.", ("stage",))
+REGEX_MATCHES = REGISTRY.counter(
+    "cadra_regex_matches_total", "Raw (pre-dedupe) matches per sensitive-item pattern.", ("pattern",))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "cadra_request_seconds", "Wall time per HTTP request.", ("endpoint",))
+REQUESTS = REGISTRY.counter(
+    "cadra_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "status"))
+LLM_ATTEMPTS = REGISTRY.counter(
+    "cadra_llm_attempts_total", "LLM backend HTTP attempts by outcome.", ("outcome",))
+
+
+class Timings:
+    """
+    Stage timings for one document or request. Nested stages are
+    subtracted from their parent, so per-stage times add up to the total.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.regex_matches = {}
+        self._stack = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        self._stack.append([0.0, 0.0])
+        try:
+            yield
+        finally:
+            child_wall, child_cpu = self._stack.pop()
+            wall = time.perf_counter() - wall0
+            cpu = time.thread_time() - cpu0
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+            wall -= child_wall
+            cpu -= child_cpu
+            s = self.stages.setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0})
+            s["wall_ms"] += wall * 1000
+            s["cpu_ms"] += cpu * 1000
+            STAGE_SECONDS.observe(wall, name)
+            STAGE_CPU_SECONDS.inc(cpu, name)
+
+    def count_matches(self, pattern, n):
+        self.regex_matches[pattern] = self.regex_matches.get(pattern, 0) + n
+        REGEX_MATCHES.inc(n, pattern)
+
+    def as_dict(self):
+        return {
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "stages": {k: {"wall_ms": round(v["wall_ms"], 3), "cpu_ms": round(v["cpu_ms"], 3)}
+                       for k, v in self.stages.items()},
+            "regex_matches": dict(self.regex_matches),
+        }
+
+
+def timed(timings, name):
+    """
+    timings.stage(name), or a no-op context when timings is None.
+    """
+    return timings.stage(name) if timings is not None else nullcontext()
@@ -0,0 +1,494 @@
+"""
+Near-duplicate index: MinHash signatures with LSH banding.
+
+Each document becomes a set of word shingles (k consecutive words). Its
+MinHash signature has num_perm minimum hash values; the share of positions
+where two signatures agree estimates the Jaccard similarity of the shingle
+sets. For lookups the signature is cut into bands; documents sharing any
+whole band land in the same bucket. Only those candidates are compared, so
+queries take time logarithmic in the index size.
+
+On disk an index is a directory:
+
+    meta.json        parameters, document ids and the journal's name
+    signatures.npy   (N, num_perm) uint32
+    band_keys.npy    (bands, N) uint64, each row sorted
+    band_docs.npy    (bands, N) uint32, document index for each key
+    hash_params.npy  (2, num_perm) uint64 MinHash multipliers and offsets
+    journal-*.bin    documents inserted since the arrays were written
+
+The arrays are memory-mapped on load, so startup cost does not grow with
+the index. Several worker processes can share one index directory:
+  - Inserts are appended to the journal, one write per document.
+  - Every lookup first reads the records other processes appended since
+    the last one.
+  - Once the journal holds JOURNAL_MAX records, the inserting process
+    folds it into the arrays and starts a journal under a new name. The
+    others reload when their journal is gone.
+  - The fold keeps only the newest max_docs documents, if set.
+  - A lock file orders inserts against the fold.
+`python neardup.py compact DIR` folds the journal on demand. Run it, and
+build, while no server is writing.
+
+The opt-in "similar" detector (see detectors.py) checks each document it
+runs on against INDEX and then inserts it.
+"""
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from cache import normalize
+
+DEFAULT_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE = 5
+DEFAULT_SEED = 1
+# Delta entries kept as unsorted arrays (scanned linearly) before they are
+# merged into the sorted ones.
+DELTA_MAX = 4096
+# Journal records before the inserting process folds them into the arrays.
+JOURNAL_MAX = int(os.getenv("CADRA_NEARDUP_JOURNAL_MAX", "4096"))
+# Shingles hashed per block, bounding the (block, num_perm) temporary.
+BLOCK = 8192
+
+RE_WORD = re.compile(r"\w+")
+_SHIFT32 = np.uint64(32)
+_FNV = np.uint64(0x100000001B3)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+
+def shingle_hashes(text, k=DEFAULT_SHINGLE):
+    """
+    Distinct 64-bit hashes of the text's word k-shingles (lowercased). A
+    text with fewer than k words is a single shingle.
+    """
+    words = RE_WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    h = np.fromiter((zlib.crc32(w.encode("utf-8", "surrogatepass")) for w in words),
+                    dtype=np.uint64, count=len(words))
+    h = (h + np.uint64(1)) * _MIX
+    n = max(1, len(words) - k + 1)
+    acc = np.zeros(n, dtype=np.uint64)
+    for j in range(min(k, len(words))):
+        acc = (acc ^ h[j:j + n]) * _FNV
+    return np.unique(acc)
+
+
+class MinHasher:
+    def __init__(self, num_perm=DEFAULT_PERM, shingle=DEFAULT_SHINGLE, seed=DEFAULT_SEED, params=None):
+        """
+        params: (2, num_perm) multipliers and offsets, as saved with an
+        index; by default drawn from seed. NumPy does not promise the same
+        random stream across versions, so a saved index keeps its own.
+        """
+        self.num_perm = num_perm
+        self.shingle = shingle
+        # Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits.
+        if params is None:
+            rng = np.random.default_rng(seed)
+            self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+            self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        else:
+            self._a, self._b = np.array(params, dtype=np.uint64)
+
+    @property
+    def params(self):
+        return np.stack([self._a, self._b])
+
+    def signature(self, text):
+        """
+        (num_perm,) uint32 signature; all 0xFFFFFFFF for a text without words.
+        """
+        sig = np.full(self.num_perm, _EMPTY, dtype=np.uint32)
+        hashes = shingle_hashes(text, self.shingle)
+        for start in range(0, len(hashes), BLOCK):
+            block = hashes[start:start + BLOCK, None]
+            values = ((block * self._a + self._b) >> _SHIFT32).astype(np.uint32)
+            np.minimum(sig, values.min(axis=0), out=sig)
+        return sig
+
+
+def band_keys(signatures, bands):
+    """
+    (bands, N) uint64 bucket keys for (N, num_perm) signatures.
+    """
+    n, num_perm = signatures.shape
+    rows = signatures.reshape(n, bands, num_perm // bands).astype(np.uint64)
+    keys = np.zeros((n, bands), dtype=np.uint64)
+    for r in range(rows.shape[2]):
+        keys = (keys ^ rows[:, :, r]) * _FNV
+    return keys.T
+
+
+class NearDupIndex:
+    def __init__(self, num_perm=DEFAULT_PERM, bands=DEFAULT_BANDS, shingle=DEFAULT_SHINGLE,
+                 seed=DEFAULT_SEED, path=None, max_docs=None):
+        """
+        bands must divide num_perm. More bands (fewer rows each) find
+        less similar documents, at more candidates per query; the default
+        64/16 catches pairs above about 0.5 Jaccard.
+        path: index directory to journal inserts into (see load()).
+        max_docs: the most documents kept. Beyond it, an index without a
+        path forgets its oldest quarter; one with a path drops the oldest
+        when the journal is folded.
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        self.hasher = MinHasher(num_perm, shingle, seed)
+        self.bands = bands
+        self.seed = seed
+        self.path = path
+        self.max_docs = max_docs
+        self.ids = []
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._keys = np.empty((bands, 0), dtype=np.uint64)
+        self._docs = np.empty((bands, 0), dtype=np.uint32)
+        self._delta_sigs = []
+        self._delta_keys = []
+        self._lock = threading.Lock()
+        # Journal file and how much of it is applied (see _sync).
+        self._journal_name = "journal.bin"
+        self._journal_pos = 0
+        self._journal_records = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- lookups ---
+
+    def _candidates(self, keys):
+        found = []
+        for band in range(self.bands):
+            row = self._keys[band]
+            lo = np.searchsorted(row, keys[band], "left")
+            hi = np.searchsorted(row, keys[band], "right")
+            if hi > lo:
+                found.append(self._docs[band, lo:hi])
+        if self._delta_keys:
+            delta = np.array(self._delta_keys, dtype=np.uint64)
+            hits = np.flatnonzero((delta == keys).any(axis=1))
+            found.append((hits + len(self._signatures)).astype(np.uint32))
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.uint32)
+
+    def _signature_of(self, i):
+        base = len(self._signatures)
+        return self._signatures[i] if i < base else self._delta_sigs[i - base]
+
+    def query(self, sig, top=5, min_jaccard=0.5):
+        """
+        [(id, estimated Jaccard)] of up to top indexed documents sharing an
+        LSH bucket with sig and at least min_jaccard similar, best first.
+        """
+        if sig[0] == _EMPTY:
+            return []
+        keys = band_keys(sig[None, :], self.bands)[:, 0]
+        with self._lock:
+            if self.path:
+                self._sync()
+            cand = self._candidates(keys)
+            if not len(cand):
+                return []
+            sigs = np.stack([self._signature_of(int(i)) for i in cand])
+            ids = [self.ids[int(i)] for i in cand]
+        jaccard = (sigs == sig).mean(axis=1)
+        order = np.argsort(-jaccard, kind="stable")
+        return [(ids[i], round(float(jaccard[i]), 3)) for i in order[:top] if jaccard[i] >= min_jaccard]
+
+    # --- inserts ---
+
+    def insert(self, doc_id, sig):
+        if sig[0] == _EMPTY:
+            return
+        keys = band_keys(sig[None, :], self.bands)[:, 0]
+        with self._lock:
+            if self.path:
+                # Read back from the journal, after whatever others wrote
+                # before it, so every process sees the same order.
+                self._journal(doc_id, sig)
+                self._sync()
+                if self._journal_records >= JOURNAL_MAX:
+                    self._fold()
+                return
+            self.ids.append(doc_id)
+            self._delta_sigs.append(sig)
+            self._delta_keys.append(keys)
+            if self.max_docs and len(self.ids) > self.max_docs:
+                self._forget(len(self.ids) - self.max_docs * 3 // 4)
+            if len(self._delta_sigs) >= DELTA_MAX:
+                self._merge()
+
+    def check(self, doc_id, text, top=5, min_jaccard=0.5):
+        """
+        Queries with text's signature, then inserts it under doc_id unless
+        an indexed document has the very same signature (it would only
+        ever match the same queries).
+        """
+        sig = self.hasher.signature(text)
+        similar = self.query(sig, top, min_jaccard)
+        if not (similar and similar[0][1] == 1.0):
+            self.insert(doc_id, sig)
+        return similar
+
+    def _merge(self):
+        # Called with self._lock held: folds the delta into the sorted arrays.
+        sigs = np.concatenate([self._signatures, np.stack(self._delta_sigs)])
+        keys = np.concatenate([self._keys, np.stack(self._delta_keys, axis=1)], axis=1)
+        self._sort(sigs, keys)
+
+    def _sort(self, sigs, keys):
+        docs = np.broadcast_to(np.arange(len(sigs), dtype=np.uint32), keys.shape)
+        order = np.argsort(keys, axis=1, kind="stable")
+        self._signatures = sigs
+        self._keys = np.take_along_axis(keys, order, axis=1)
+        self._docs = np.take_along_axis(docs, order, axis=1)
+        self._delta_sigs = []
+        self._delta_keys = []
+
+    def _forget(self, n):
+        # Called with self._lock held: drops the n oldest documents.
+        if self._delta_sigs:
+            self._merge()
+        sigs = self._signatures[n:]
+        self.ids = self.ids[n:]
+        self._sort(sigs, band_keys(sigs, self.bands))
+
+    # --- persistence ---
+
+    @contextlib.contextmanager
+    def _file_lock(self, op):
+        # Inserts hold it shared and the fold exclusively, so no record goes
+        # to a journal that is being replaced. Closing the fd releases it.
+        fd = os.open(os.path.join(self.path, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, op)
+            yield
+        finally:
+            os.close(fd)
+
+    def _journal(self, doc_id, sig):
+        raw = str(doc_id).encode("utf-8", "surrogatepass")
+        record = struct.pack("<H", len(raw)) + raw + sig.astype("<u4").tobytes()
+        with self._file_lock(fcntl.LOCK_SH):
+            try:
+                fd = os.open(os.path.join(self.path, self._journal_name), os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                # Folded by another process: pick up the new journal.
+                self._read()
+                fd = os.open(os.path.join(self.path, self._journal_name), os.O_WRONLY | os.O_APPEND)
+            try:
+                # One O_APPEND write per record keeps concurrent writers' records whole.
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+
+    def _sync(self, locked=False):
+        # Called with self._lock held: applies what other processes wrote
+        # since the last call, the new journal records or, once the journal
+        # was folded (and so deleted), the whole index.
+        try:
+            if os.path.getsize(os.path.join(self.path, self._journal_name)) > self._journal_pos:
+                self._replay()
+            return
+        except FileNotFoundError:
+            pass
+        if locked:
+            self._read()
+        else:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._read()
+
+    def _read(self):
+        # Called with self._lock and the file lock held: (re)loads the
+        # arrays, then replays the journal.
+        path = self.path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        params = os.path.join(path, "hash_params.npy")
+        if os.path.exists(params):
+            self.hasher = MinHasher(meta["num_perm"], meta["shingle"], meta["seed"], np.load(params))
+        self.ids = meta["ids"]
+        self._journal_name = meta.get("journal", "journal.bin")
+        self._signatures = np.load(os.path.join(path, "signatures.npy"), mmap_mode="r")
+        self._keys = np.load(os.path.join(path, "band_keys.npy"), mmap_mode="r")
+        self._docs = np.load(os.path.join(path, "band_docs.npy"), mmap_mode="r")
+        self._delta_sigs = []
+        self._delta_keys = []
+        self._journal_pos = 0
+        self._journal_records = 0
+        self._replay()
+
+    def _replay(self):
+        # Applies the whole journal records past self._journal_pos.
+        try:
+            f = open(os.path.join(self.path, self._journal_name), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._journal_pos)
+            data = f.read()
+        sig_bytes = 4 * self.hasher.num_perm
+        pos = 0
+        while pos + 2 <= len(data):
+            (n,) = struct.unpack_from("<H", data, pos)
+            end = pos + 2 + n + sig_bytes
+            if end > len(data):
+                break
+            doc_id = data[pos + 2:pos + 2 + n].decode("utf-8", "surrogatepass")
+            sig = np.frombuffer(data, "<u4", self.hasher.num_perm, pos + 2 + n).astype(np.uint32)
+            self.ids.append(doc_id)
+            self._delta_sigs.append(sig)
+            self._delta_keys.append(band_keys(sig[None, :], self.bands)[:, 0])
+            if len(self._delta_sigs) >= DELTA_MAX:
+                self._merge()
+            self._journal_records += 1
+            pos = end
+        self._journal_pos += pos
+
+    def _fold(self):
+        # Called with self._lock held: writes everything, journal included,
+        # as arrays (the newest max_docs documents), then starts a new
+        # journal.
+        with self._file_lock(fcntl.LOCK_EX):
+            if os.path.exists(os.path.join(self.path, "meta.json")):
+                self._sync(locked=True)
+            if self._delta_sigs:
+                self._merge()
+            if self.max_docs and len(self.ids) > self.max_docs:
+                self._forget(len(self.ids) - self.max_docs)
+            old = os.path.join(self.path, self._journal_name)
+            self._journal_name = f"journal-{secrets.token_hex(8)}.bin"
+            open(os.path.join(self.path, self._journal_name), "wb").close()
+            self._write(self.path)
+            try:
+                os.unlink(old)
+            except FileNotFoundError:
+                pass
+            # Back to memory-mapped arrays instead of the merged copies.
+            self._read()
+
+    def _write(self, path):
+        meta = {
+            "num_perm": self.hasher.num_perm,
+            "bands": self.bands,
+            "shingle": self.hasher.shingle,
+            "seed": self.seed,
+            "ids": self.ids,
+            "journal": self._journal_name,
+        }
+        for name, arr in (("signatures", self._signatures), ("band_keys", self._keys),
+                          ("band_docs", self._docs), ("hash_params", self.hasher.params)):
+            tmp = os.path.join(path, name + ".tmp.npy")
+            np.save(tmp, np.ascontiguousarray(arr))
+            os.replace(tmp, os.path.join(path, name + ".npy"))
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, separators=(",", ":"))
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path, max_docs=None, **params):
+        """
+        Opens the index directory at path (creating it when missing), with
+        the arrays memory-mapped and the journal replayed. params are used
+        for a new directory; an existing one keeps its own.
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            os.makedirs(path, exist_ok=True)
+            index = cls(path=path, max_docs=max_docs, **params)
+            index.save()
+            return index
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["num_perm"], meta["bands"], meta["shingle"], meta["seed"], path=path,
+                    max_docs=max_docs)
+        with index._lock, index._file_lock(fcntl.LOCK_SH):
+            index._read()
+        return index
+
+    def save(self, path=None):
+        """
+        Writes everything, journal included, as arrays to path. The default
+        is the index's own directory, whose journal is then folded.
+        """
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            if path == self.path:
+                self._fold()
+                return
+            if self._delta_sigs:
+                self._merge()
+            self._write(path)
+            open(os.path.join(path, self._journal_name), "ab").close()
+
+
+# --- the "similar" detector ---
+
+TOP = int(os.getenv("CADRA_NEARDUP_TOP", "5"))
+MIN_JACCARD = float(os.getenv("CADRA_NEARDUP_MIN_JACCARD", "0.5"))
+INDEX_PATH = os.getenv("CADRA_NEARDUP_PATH")
+# Caps the index (about 500 bytes per document in memory).
+MAX_DOCS = int(os.getenv("CADRA_NEARDUP_MAX_DOCS", "50000"))
+INDEX = NearDupIndex.load(INDEX_PATH, MAX_DOCS) if INDEX_PATH else NearDupIndex(max_docs=MAX_DOCS)
+
+
+def document_id(text):
+    """
+    Id for documents analyzed without one: a hash of the normalized text.
+    """
+    return hashlib.sha256(normalize(text).encode("utf-8", "surrogatepass")).hexdigest()[:16]
+
+
+def similar(analysis):
+    """
+    Detector target: the top similar prior documents, then indexes this one
+    under the caller's doc_id (default: document_id()).
+    """
+    doc_id = analysis.doc_id
+    doc_id = document_id(analysis.text) if doc_id is None else str(doc_id)
+    matches = INDEX.check(doc_id, analysis.text, TOP, MIN_JACCARD)
+    return [{"id": doc_id, "jaccard": j} for doc_id, j in matches]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or compact a near-duplicate index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="index documents (directory, glob or .jsonl, as in batch.py)")
+    build.add_argument("source")
+    build.add_argument("index", help="index directory (created or extended)")
+    build.add_argument("--id-field", default="id")
+    build.add_argument("--text-field", default="text")
+    compact = sub.add_parser("compact", help="fold the journal into the arrays")
+    compact.add_argument("index")
+    args = parser.parse_args(argv)
+
+    index = NearDupIndex.load(args.index)
+    if args.command == "build":
+        from batch import iter_source
+        # The arrays are written once at the end, not journaled per document.
+        index.path = None
+        for doc_id, text, path in iter_source(args.source, args.id_field, args.text_field):
+            if text is None:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+            index.insert(str(doc_id), index.hasher.signature(text))
+        index.path = args.index
+    index.save()
+    print(f"{len(index)} documents in {args.index}")
+
+
+if __name__ == "__main__":
+    main()
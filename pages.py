@@ -0,0 +1,203 @@
+"""
+Paged, highlighted document display for the result page.
+
+Analyzed documents are kept as UTF-8 files in a temporary directory shared
+by all workers, under an unguessable key. The result page shows the first
+page and fetches the others on demand (GET /documents/<key>/pages/<n>),
+so the browser never lays out the whole document and the server never
+renders it as one string.
+
+A page is the bytes [n * PAGE_BYTES, (n + 1) * PAGE_BYTES), both ends moved
+forward to the next character start, so any page is found with one seek.
+PII, toxic and suspicious spans are highlighted per page. The page is
+scanned with HIGHLIGHT_CONTEXT bytes of context on both sides, so matches
+crossing a page edge are highlighted on both pages.
+"""
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import time
+
+from redact import LABELS, spans
+from stream import DEFAULT_OVERLAP
+
+PAGE_BYTES = int(os.getenv("CADRA_PAGE_KB", "32")) << 10
+HIGHLIGHT_CONTEXT = DEFAULT_OVERLAP
+HIGHLIGHT_TYPES = tuple(LABELS)
+
+RE_KEY = re.compile(r"[0-9a-f]{32}")
+
+
+def _char_start(f, offset, size):
+    """
+    The first offset >= offset that does not point into the middle of a
+    UTF-8 sequence.
+    """
+    if offset <= 0 or offset >= size:
+        return max(0, min(offset, size))
+    f.seek(offset)
+    for i, byte in enumerate(f.read(4)):
+        if byte & 0xC0 != 0x80:
+            return offset + i
+    return min(offset + 4, size)
+
+
+def highlight(text, start=0, end=None):
+    """
+    Splits text[start:end] into [(type or None, segment)], a type for
+    every highlighted span. Spans are found on the whole of text, so
+    text around the slice serves as context.
+    """
+    if end is None:
+        end = len(text)
+    segments = []
+    pos = start
+    for s, e, kind in spans(text, HIGHLIGHT_TYPES):
+        s, e = max(s, pos), min(e, end)
+        if s >= e:
+            continue
+        if s > pos:
+            segments.append((None, text[pos:s]))
+        segments.append((kind, text[s:e]))
+        pos = e
+    if pos < end:
+        segments.append((None, text[pos:end]))
+    return segments
+
+
+class Page:
+    __slots__ = ("key", "number", "count", "segments")
+
+    def __init__(self, key, number, count, segments):
+        self.key = key
+        self.number = number
+        self.count = count
+        self.segments = segments
+
+
+class DocumentStore:
+    def __init__(self, directory=None, ttl=3600, page_bytes=PAGE_BYTES, max_bytes=256 << 20,
+                 max_document_bytes=8 << 20):
+        """
+        directory: where documents are kept (default: cadra-docs in the
+        system temp directory). It and the documents are private to the
+        user running the server (modes 0700 and 0600); a directory owned
+        by someone else is refused.
+        When a document is added, those older than ttl seconds are deleted,
+        then the oldest others until all fit in max_bytes. adopt() keeps
+        only the first max_document_bytes of a file.
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "cadra-docs")
+        self.ttl = ttl
+        self.page_bytes = page_bytes
+        self.max_bytes = max_bytes
+        self.max_document_bytes = max_document_bytes
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        # Also tightens a directory left by an earlier version; fails with
+        # PermissionError when another user owns it.
+        os.chmod(self.directory, 0o700)
+
+    def _path(self, key):
+        if not RE_KEY.fullmatch(key):
+            raise KeyError(key)
+        return os.path.join(self.directory, key + ".txt")
+
+    def _prune(self, incoming):
+        # Makes room for incoming more bytes: expired documents first, then
+        # the oldest.
+        cutoff = time.time() - self.ttl
+        kept = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if not entry.name.endswith(".txt"):
+                        continue
+                    st = entry.stat()
+                    if st.st_mtime < cutoff:
+                        os.unlink(entry.path)
+                    else:
+                        kept.append((st.st_mtime, st.st_size, entry.path))
+                except OSError:
+                    pass
+        total = incoming + sum(size for _, size, _ in kept)
+        for _, size, path in sorted(kept):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def put(self, text):
+        """
+        Stores text; returns its key.
+        """
+        data = text.encode("utf-8", "surrogatepass")
+        self._prune(len(data))
+        key = secrets.token_hex(16)
+        # mkstemp creates the file with mode 0600.
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        return key
+
+    def adopt(self, path):
+        """
+        Moves the file at path (UTF-8 text, mode 0600) into the store, cut
+        to max_document_bytes; returns its key.
+        """
+        size = os.path.getsize(path)
+        if size > self.max_document_bytes:
+            with open(path, "rb") as f:
+                # Cut at a character start, at most 3 bytes further.
+                size = _char_start(f, self.max_document_bytes, size)
+            os.truncate(path, size)
+        self._prune(size)
+        key = secrets.token_hex(16)
+        shutil.move(path, self._path(key))
+        return key
+
+    def size(self, key):
+        """
+        Bytes kept of the document; raises KeyError for an unknown key.
+        """
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def page_count(self, key):
+        return max(1, -(-self.size(key) // self.page_bytes))
+
+    def page(self, key, number):
+        """
+        Returns page number of the document (a Page), or None past the last
+        page. Raises KeyError for an unknown or expired key.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            raise KeyError(key)
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            count = max(1, -(-size // self.page_bytes))
+            if not 0 <= number < count:
+                return None
+            start = _char_start(f, number * self.page_bytes, size)
+            end = _char_start(f, (number + 1) * self.page_bytes, size)
+            lo = _char_start(f, start - HIGHLIGHT_CONTEXT, size)
+            hi = _char_start(f, end + HIGHLIGHT_CONTEXT, size)
+            f.seek(lo)
+            data = f.read(hi - lo)
+        # Decoded in three parts cut at character starts, so the page's
+        # offsets in the decoded text are exact even with invalid UTF-8.
+        before = data[:start - lo].decode("utf-8", "replace")
+        body = data[start - lo:end - lo].decode("utf-8", "replace")
+        after = data[end - lo:].decode("utf-8", "replace")
+        text = before + body + after
+        return Page(key, number, count, highlight(text, len(before), len(before) + len(body)))
@@ -0,0 +1,167 @@
+"""
+Aho-Corasick multi-phrase matcher for the detector lexicons.
+
+The automaton is built once per lexicon and reports every occurrence of
+every phrase in a single left-to-right pass, so matching cost stays linear
+in the document length no matter how many phrases the lexicon holds.
+Matching is case-sensitive; callers pass already-lowercased text.
+"""
+from collections import Counter, deque
+
+# Below this many phrases a C-level str.find per phrase beats walking the
+# automaton in Python (the measured crossover is a few hundred phrases), so
+# hits() and finditer() take the direct route for small lexicons.
+SMALL_LEXICON = 128
+
+
+def _is_word_char(ch):
+    # Same definition as the re module's \w for str patterns.
+    return ch.isalnum() or ch == "_"
+
+
+class PhraseMatcher:
+    def __init__(self, phrases, word_boundary=False):
+        """
+        phrases: iterable of lexicon entries; duplicates are ignored and the
+        first-seen order is kept as the lexicon order.
+        word_boundary: only report hits not glued to a neighbouring word
+        character, so "kill" no longer matches inside "skill".
+        """
+        self.phrases = list(dict.fromkeys(p for p in phrases if p))
+        self.word_boundary = word_boundary
+        goto = [{}]
+        out = [()]
+        for idx, phrase in enumerate(self.phrases):
+            state = 0
+            for ch in phrase:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (idx,)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        self._lens = [len(p) for p in self.phrases]
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def _boundary_ok(self, text, start, end):
+        if start > 0 and _is_word_char(text[start]) and _is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and _is_word_char(text[end - 1]) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def _scan(self, text, start, end):
+        """
+        Yields (end, phrase_index) for every raw hit inside text[start:end],
+        ignoring word boundaries.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        if start or end < len(text):
+            text = text[start:end]
+        for i, ch in enumerate(text, start):
+            if state == 0:
+                state = root.get(ch, 0)
+                if state == 0:
+                    continue
+            else:
+                trans = goto[state]
+                while ch not in trans:
+                    state = fail[state]
+                    if state == 0:
+                        break
+                    trans = goto[state]
+                state = goto[state].get(ch, 0)
+            if out[state]:
+                for idx in out[state]:
+                    yield i + 1, idx
+
+    def finditer(self, text: str, start=0, end=None):
+        """
+        Yields (start, end, phrase) for every occurrence inside
+        text[start:end], including overlapping ones, in order of their end
+        offset.
+        """
+        if end is None:
+            end = len(text)
+        lens, phrases = self._lens, self.phrases
+        if len(phrases) <= SMALL_LEXICON:
+            yield from self._finditer_small(text, start, end)
+            return
+        for hit_end, idx in self._scan(text, start, end):
+            hit_start = hit_end - lens[idx]
+            if self.word_boundary and not self._boundary_ok(text, hit_start, hit_end):
+                continue
+            yield hit_start, hit_end, phrases[idx]
+
+    def _finditer_small(self, text, start, end):
+        # One C-level str.find sweep per phrase, then the automaton's order:
+        # by end offset, longer phrases first.
+        hits = []
+        for phrase, n in zip(self.phrases, self._lens):
+            i = text.find(phrase, start, end)
+            while i != -1:
+                hits.append((i + n, -n, phrase))
+                i = text.find(phrase, i + 1, end)
+        hits.sort()
+        for hit_end, neg_len, phrase in hits:
+            hit_start = hit_end + neg_len
+            if self.word_boundary and not self._boundary_ok(text, hit_start, hit_end):
+                continue
+            yield hit_start, hit_end, phrase
+
+    def counts(self, text: str):
+        """
+        Returns a Counter of phrase -> number of (possibly overlapping)
+        occurrences.
+        """
+        return Counter(p for _, _, p in self.finditer(text))
+
+    def _found(self, text, phrase, lo, hi):
+        start = text.find(phrase, lo, hi)
+        while start != -1:
+            end = start + len(phrase)
+            if not self.word_boundary or self._boundary_ok(text, start, end):
+                return True
+            start = text.find(phrase, start + 1, hi)
+        return False
+
+    def hits(self, text: str, start=0, end=None):
+        """
+        Returns the phrases that occur in text, in lexicon order. Stops
+        scanning as soon as every phrase has been seen.
+
+        start/end restrict the search to hits lying wholly inside
+        text[start:end]; characters outside still serve as word-boundary
+        context.
+        """
+        if end is None:
+            end = len(text)
+        if len(self.phrases) <= SMALL_LEXICON:
+            return [p for p in self.phrases if self._found(text, p, start, end)]
+        seen = set()
+        total = len(self.phrases)
+        for _, _, p in self.finditer(text, start, end):
+            seen.add(p)
+            if len(seen) == total:
+                break
+        return [p for p in self.phrases if p in seen]
@@ -0,0 +1,82 @@
+"""
+Linear-time matching for the sensitive-item patterns.
+
+re backtracks, and findall() retries a failed pattern at every following
+position. For RE_EMAIL that is quadratic: every start inside a long run of
+local-part characters rescans the run looking for an '@'. RunStartPattern
+only lets the pattern start where such a run starts, so each run is
+scanned once per attempt and attempts never overlap.
+
+The other sensitive patterns already run in linear time under re. In
+detector.py, RE_PHONE, RE_AADHAAR, RE_NUMERIC_LONG, RE_IP and the www.
+branch of RE_URL each begin with a literal backspace byte (\\x08). The digit
+patterns also end with one. It is invisible in most editors;
+repr(RE_PHONE.pattern) shows it. These bytes were once "\\b" escapes.
+create_cadra_files.py writes detector.py from a non-raw string, which turns
+"\\b" into a backspace. The other URL branch begins with "http". So an
+attempt can only start at one of those literals, and it is not retried
+inside the run that follows:
+  - (?:\\+?91[\\-\\s]?)? and the {n} repeats are bounded.
+  - \\s* and \\d{9,} cannot cross a backspace, and after giving a
+    character back they fail on the next one.
+  - \\S+ ends the pattern, so it never backtracks.
+bench.py --pathological measures all of them on adversarial input.
+"""
+import re
+
+
+class RunStartPattern:
+    """
+    Drop-in for a compiled pattern that begins with LEAD+ followed by a
+    character outside LEAD. Any match starting inside a LEAD run would also
+    match, with the same end, from the start of that run, and findall()
+    takes the leftmost. So starts after a LEAD character are skipped,
+    except right at pos or right after a previous match. There findall()
+    would start too. search(), finditer() and findall() return exactly what
+    the wrapped regex would.
+    """
+    def __init__(self, regex, lead):
+        """
+        regex: the compiled pattern. lead: its leading character class, as
+        regex source of the same type (str or bytes).
+        """
+        self.regex = regex
+        self.lead = lead
+        self.pattern = regex.pattern
+        self.flags = regex.flags
+        if isinstance(lead, str):
+            guarded = "(?<!" + lead + ")(?:" + regex.pattern + ")"
+        else:
+            guarded = b"(?<!" + lead + b")(?:" + regex.pattern + b")"
+        self._guarded = re.compile(guarded, regex.flags)
+        self._lead = re.compile(lead, regex.flags)
+
+    def to_bytes(self):
+        """
+        The same matcher over bytes-like text (bytes, mmap).
+        """
+        def enc(s):
+            return s.encode("utf-8") if isinstance(s, str) else s
+        return RunStartPattern(re.compile(enc(self.pattern), self.flags & ~re.UNICODE), enc(self.lead))
+
+    def finditer(self, text, pos=0, endpos=None):
+        if endpos is None or endpos > len(text):
+            endpos = len(text)
+        match, search, lead = self.regex.match, self._guarded.search, self._lead.match
+        while True:
+            m = None
+            if 0 < pos < endpos and lead(text, pos - 1, pos) and lead(text, pos, pos + 1):
+                # pos is mid-run, where the guard would refuse to start.
+                m = match(text, pos, endpos)
+            if m is None:
+                m = search(text, pos, endpos)
+                if m is None:
+                    return
+            yield m
+            pos = m.end()
+
+    def findall(self, text, pos=0, endpos=None):
+        return [m.group() for m in self.finditer(text, pos, endpos)]
+
+    def search(self, text, pos=0, endpos=None):
+        return next(self.finditer(text, pos, endpos), None)
@@ -0,0 +1,271 @@
+"""
+Analysis pipeline for a single document.
+
+Each stage is computed on first access and cached on the Analysis object,
+so later stages (scoring, evidence, the fallback report) reuse the lowered
+text, tokens, sentences and detector outputs instead of recomputing them.
+
+Pass a metrics.Timings to record wall and CPU time for every stage, and a
+detectors.plan() to limit the report to some detectors. Scoring, evidence
+and the fallback then only consider the sections that ran.
+"""
+from functools import cached_property, wraps
+
+from detectors import BUILTIN, DETECTORS, plan
+from metrics import timed
+from scanner import dedupe
+
+
+# The most each section can add to the score: the sum of its per-signal
+# caps in score_from(). Triage uses them to bound what is still unknown.
+SCORE_CAPS = {"sensitive": 65, "tone": 65, "structure": 10, "plagiarism_hint": 10}
+
+
+def score_from(sections):
+    """
+    The 0-100 risk score for the given detector sections.
+    """
+    s, tone, struct, pl = (sections.get(k) for k in ("sensitive", "tone", "structure", "plagiarism_hint"))
+    score = 0
+    if s is not None:
+        if s['emails']: score += 20
+        if s['phones']: score += 20
+        if s['aadhar_like'] or s['long_numbers']: score += 25
+    if tone is not None:
+        score += min(20, len(tone['suspicious_hits'])*6)
+        score += min(20, len(tone['toxic_hits'])*12)
+        score += max(0, (50 - tone['tone_score'])//2)
+    if struct is not None:
+        score += min(10, struct['long_sentences_count']*3)
+    if pl is not None:
+        score += min(10, len(pl['template_hits'])*5)
+    return int(max(0, min(100, score)))
+
+
+def risk_level_for(score):
+    return "High" if score>=61 else "Medium" if score>=31 else "Low"
+
+
+def evidence_from(sections):
+    """
+    The report's evidence lines for the given detector sections.
+    """
+    s = sections.get("sensitive") or {}
+    tone = sections.get("tone") or {}
+    pl = sections.get("plagiarism_hint") or {}
+    evidence = []
+    if s.get('emails'): evidence.append(f"Emails found: {len(s['emails'])}")
+    if s.get('phones'): evidence.append(f"Phone numbers found: {len(s['phones'])}")
+    if s.get('urls'): evidence.append(f"URLs found: {len(s['urls'])}")
+    if tone.get('toxic_hits'): evidence.append(f"Toxic words: {', '.join(tone['toxic_hits'])}")
+    if tone.get('suspicious_hits'): evidence.append(f"Suspicious phrases: {', '.join(tone['suspicious_hits'])}")
+    if pl.get('template_hits'): evidence.append(f"Common templates matched: {', '.join(pl['template_hits'])}")
+    return evidence
+
+
+def fallback_from(sections):
+    """
+    The heuristic LLM stand-in for the given detector sections.
+    """
+    sensitive = sections.get("sensitive") or {}
+    tone = sections.get("tone") or {}
+    struct = sections.get("structure") or {}
+    pl = sections.get("plagiarism_hint") or {}
+    issues = []
+    if sensitive.get('emails') or sensitive.get('phones') or sensitive.get('aadhar_like') or sensitive.get('long_numbers'):
+        issues.append("Contains potential personally identifiable information (PII).")
+    if tone.get('toxic_hits'):
+        issues.append("Contains toxic or insulting language.")
+    if tone.get('suspicious_hits'):
+        issues.append("Contains suspicious phrases (payment/login/request).")
+    if pl.get('template_hits'):
+        issues.append("Contains common template phrases; check originality.")
+    if struct.get('long_sentences_count', 0)>0:
+        issues.append("Contains very long sentences; consider breaking for clarity.")
+    summary = "The document has " + (", ".join(issues) if issues else "no immediate obvious red flags.")
+    rewrites = []
+    if sensitive.get('phones'):
+        rewrites.append("Remove phone numbers or redact them like +91-XXXXXXXXXX.")
+    if tone.get('toxic_hits'):
+        rewrites.append("Replace insulting phrases with neutral language.")
+    if not rewrites:
+        rewrites.append("Document appears generally fine; improve clarity if needed.")
+    advice = [
+        "Redact any PII before publishing.",
+        "Use neutral tone; avoid accusatory language.",
+        "Break long sentences; add citations where needed."
+    ]
+    return {"summary": summary, "issues": issues, "rewrite_suggestions": rewrites, "advice": advice}
+
+
+def stage(fn):
+    """
+    cached_property that also times the computation when the Analysis
+    carries a Timings.
+    """
+    @wraps(fn)
+    def wrapper(self):
+        with timed(self.timings, fn.__name__):
+            return fn(self)
+    return cached_property(wrapper)
+
+
+class Analysis:
+    def __init__(self, text: str, scanner, timings=None, detectors=None, doc_id=None):
+        """
+        doc_id: the caller's id for the document, under which stateful
+        detectors (e.g. "similar") record it.
+        """
+        self.text = text
+        self.scanner = scanner
+        self.timings = timings
+        self.detectors = plan() if detectors is None else detectors
+        self.doc_id = doc_id
+
+    @classmethod
+    def from_sections(cls, scanner, **sections):
+        """
+        Builds an Analysis from detector sections computed elsewhere (e.g.
+        by the streaming analyzer); only the derived stages remain to run.
+        """
+        a = cls(None, scanner, detectors=plan(BUILTIN))
+        # Seeding the instance dict is how cached_property stores results.
+        a.__dict__.update(sections)
+        return a
+
+    # --- shared intermediates ---
+
+    @stage
+    def low(self):
+        return self.text.lower()
+
+    @stage
+    def sentences(self):
+        return self.scanner.sentences(self.text)
+
+    @stage
+    def word_stats(self):
+        return self.scanner.word_stats(self.text)
+
+    @stage
+    def term_counts(self):
+        return self.scanner.term_counts(self.low)
+
+    @stage
+    def phrase_hits(self):
+        return self.scanner.phrase_hits(self.low)
+
+    # --- detector outputs ---
+
+    @stage
+    def sensitive(self):
+        raw = self.scanner.sensitive_matches(self.text)
+        if self.timings is not None:
+            for key, matches in raw.items():
+                self.timings.count_matches(key, len(matches))
+        return {k: dedupe(v) for k, v in raw.items()}
+
+    @stage
+    def tone(self):
+        return self.scanner.tone(self.text, self.phrase_hits)
+
+    @stage
+    def structure(self):
+        word_count, word_chars = self.word_stats
+        return self.scanner.structure(self.sentences, word_count, word_chars)
+
+    @stage
+    def plagiarism(self):
+        return self.scanner.plagiarism(self.phrase_hits, self.term_counts)
+
+    @cached_property
+    def sections(self):
+        """
+        {report section: output} for the planned detectors, filled in plan
+        order so a detector can read the sections it requires.
+        """
+        out = self.__dict__["sections"] = {}
+        for d in self.detectors:
+            with timed(self.timings, d.name):
+                out[d.section] = d.run(self)
+        return out
+
+    def run_more(self, detectors, sections=None):
+        """
+        Runs detectors beyond the planned ones, after them (detector.analyze
+        runs the stateful ones this way, also on a cache hit). sections:
+        those already known, if this Analysis did not compute them. Returns
+        the new sections.
+        """
+        if sections is not None:
+            self.__dict__["sections"] = dict(sections)
+        new = {}
+        for d in detectors:
+            with timed(self.timings, d.name):
+                new[d.section] = self.sections[d.section] = d.run(self)
+        return new
+
+    def _section(self, name):
+        return self.sections.get(name)
+
+    def triage(self, threshold):
+        """
+        Runs the planned detectors in plan (cost) order only until the score
+        is certain to end at or above threshold, or certain to stay below
+        it. Detectors that cannot change the score are not run unless a
+        scoring one requires them. Returns (names of the detectors skipped,
+        whether it stopped before a scoring one); sections, score and the
+        other derived stages then cover only the detectors that ran.
+        """
+        needed = set()
+        for d in reversed(self.detectors):
+            if d.section in SCORE_CAPS or d.name in needed:
+                needed.update(d.requires)
+        run = [d for d in self.detectors if d.section in SCORE_CAPS or d.name in needed]
+        skipped = [d.name for d in self.detectors if d not in run]
+        out = self.__dict__["sections"] = {}
+        unknown = sum(SCORE_CAPS.get(d.section, 0) for d in run)
+        for i, d in enumerate(run):
+            score = score_from(out)
+            if score >= threshold or min(100, score + unknown) < threshold:
+                return [x.name for x in run[i:]] + skipped, True
+            with timed(self.timings, d.name):
+                out[d.section] = d.run(self)
+            unknown -= SCORE_CAPS.get(d.section, 0)
+        return skipped, False
+
+    # --- derived report sections ---
+
+    @stage
+    def score(self):
+        return score_from(self.sections)
+
+    @stage
+    def risk_level(self):
+        return risk_level_for(self.score)
+
+    @stage
+    def evidence(self):
+        return evidence_from(self.sections)
+
+    @stage
+    def fallback(self):
+        """
+        Heuristic stand-in for the LLM section, built from the cached
+        detector outputs.
+        """
+        return fallback_from(self.sections)
+
+    def report(self, llm_result=None):
+        sections = self.sections
+        report = {
+            "score": self.score,
+            "risk_level": self.risk_level,
+            "evidence": self.evidence,
+        }
+        # Sections in registration order, whatever order they ran in.
+        for d in DETECTORS.values():
+            if d.section in sections:
+                report[d.section] = sections[d.section]
+        report["llm"] = llm_result
+        return report
@@ -0,0 +1,319 @@
+"""
+Redaction: the document with every detected PII item (and optionally toxic
+or suspicious phrases) replaced by a mask.
+
+    python redact.py in.txt -o out.txt --mask phones=x --mask emails=hash
+    python redact.py big.log -o big.redacted.log --types emails,phones,toxic
+
+The detectors report (start, end) spans. Overlapping spans are merged, and
+the output is built in one left-to-right pass over the sorted spans,
+joining untouched slices and masks. The text is never rescanned or
+str.replace()d. StreamingRedactor does the same over chunks (using the
+stream.py windows), writing each stretch as soon as no later match can
+reach into it, so large files go through in bounded memory.
+
+Mask styles, per type:
+    label    [EMAIL], [PHONE], ...
+    x        letters and digits become X, punctuation stays (+91-XXXXXXXXXX)
+    partial  like x, but the last four letters/digits stay
+    hash     [EMAIL:1a2b3c4d], the same for every occurrence of a value
+    remove   nothing
+Any other string is used literally.
+"""
+import argparse
+import hashlib
+import heapq
+import os
+import re
+import sys
+
+from detector import SCANNER
+from scanner import SENSITIVE_KEYS, lower_aligned
+from stream import DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, _RegexStream, _Window, iter_file
+
+PII_TYPES = tuple(key for key, _ in SENSITIVE_KEYS)
+PHRASE_TYPES = ("toxic", "suspicious")
+LABELS = {
+    "emails": "EMAIL", "phones": "PHONE", "urls": "URL", "aadhar_like": "AADHAAR",
+    "long_numbers": "NUMBER", "ips": "IP", "toxic": "TOXIC", "suspicious": "SUSPICIOUS",
+}
+# Where spans of different types coincide, the earlier type here wins.
+RANK = {t: i for i, t in enumerate(LABELS)}
+DEFAULT_STYLE = os.getenv("CADRA_REDACT_STYLE", "label")
+PARTIAL_KEEP = 4
+
+RE_ALNUM = re.compile(r"[^\W_]")
+
+
+def _masker(style, label):
+    if style == "label":
+        mask = f"[{label}]"
+        return lambda value: mask
+    if style == "x":
+        return lambda value: RE_ALNUM.sub("X", value)
+    if style == "partial":
+        def partial(value):
+            hide = len(RE_ALNUM.findall(value)) - PARTIAL_KEEP
+            return RE_ALNUM.sub("X", value, count=hide) if hide > 0 else value
+        return partial
+    if style == "hash":
+        return lambda value: f"[{label}:{hashlib.sha256(value.encode('utf-8', 'surrogatepass')).hexdigest()[:8]}]"
+    if style == "remove":
+        return lambda value: ""
+    return lambda value: style
+
+
+def parse_masks(spec):
+    """
+    "phones=x,emails=hash" (or a list of such items, or a dict) -> {type:
+    style}. Raises ValueError for an unknown type or a value of the wrong
+    type.
+    """
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        items = spec.items()
+    else:
+        if isinstance(spec, str):
+            spec = spec.split(",")
+        if not isinstance(spec, (list, tuple)) or not all(isinstance(item, str) for item in spec):
+            raise ValueError("masks are given as type=style strings")
+        items = [item.split("=", 1) for item in spec if item.strip()]
+        if any(len(item) != 2 for item in items):
+            raise ValueError("masks are given as type=style")
+    masks = {}
+    for kind, style in items:
+        if not isinstance(kind, str) or not isinstance(style, str):
+            raise ValueError("mask types and styles must be strings")
+        kind = kind.strip()
+        if kind != "*" and kind not in LABELS:
+            raise ValueError(f"unknown redaction type: {kind}")
+        masks[kind] = style.strip()
+    return masks
+
+
+def parse_types(spec):
+    """
+    "emails,toxic" (or a list) -> tuple of types; None means every PII type.
+    Raises ValueError for an unknown type or a value of the wrong type.
+    """
+    if not spec:
+        return PII_TYPES
+    if isinstance(spec, str):
+        spec = spec.split(",")
+    if not isinstance(spec, (list, tuple)) or not all(isinstance(t, str) for t in spec):
+        raise ValueError("types must be a string or a list of strings")
+    types = tuple(t.strip() for t in spec if t.strip())
+    unknown = [t for t in types if t not in LABELS]
+    if unknown:
+        raise ValueError("unknown redaction types: " + ", ".join(unknown))
+    return types
+
+
+def _maskers(masks, types):
+    masks = parse_masks(masks)
+    default = masks.get("*", DEFAULT_STYLE)
+    return {t: _masker(masks.get(t, default), LABELS[t]) for t in types}
+
+
+def spans(text, types=None, scanner=SCANNER):
+    """
+    Sorted [(start, end, type)] of the items to redact in text, merged so
+    they do not overlap; a merged span takes the type of its first part.
+    """
+    types = parse_types(types)
+    found = []
+    if any(t in PII_TYPES for t in types):
+        for kind, hits in scanner.sensitive_spans(text).items():
+            if kind in types:
+                found += [(s, e, kind) for s, e, _ in hits]
+    if any(t in PHRASE_TYPES for t in types):
+        for kind, hits in scanner.phrase_spans(text).items():
+            if kind in types:
+                found += [(s, e, kind) for s, e, _ in hits]
+    found.sort(key=lambda span: (span[0], -span[1], RANK[span[2]]))
+    merged = []
+    for start, end, kind in found:
+        if merged and start < merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end, merged[-1][2])
+        else:
+            merged.append((start, end, kind))
+    return merged
+
+
+def redact(text, masks=None, types=None, scanner=SCANNER):
+    """
+    Returns text with every span of the given types masked.
+    masks: {type: style} or "type=style,..."; '*' sets the default style.
+    """
+    types = parse_types(types)
+    maskers = _maskers(masks, types)
+    parts = []
+    pos = 0
+    for start, end, kind in spans(text, types, scanner):
+        parts.append(text[pos:start])
+        parts.append(maskers[kind](text[start:end]))
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+class _PhraseSpanStream:
+    """
+    Lexicon hits with absolute offsets, each reported once although the
+    windows overlap.
+    """
+    def __init__(self, matcher, on_span):
+        self.matcher = matcher
+        self.on_span = on_span
+        self.maxlen = max((len(p) for p in matcher.phrases), default=1)
+        self.pos = 0
+        self._done = 0
+
+    def feed(self, buf, base, commit, final):
+        # Hold back one character so word-boundary checks see the next one.
+        lo = self.pos - base
+        hi = len(buf) if final else len(buf) - 1
+        if hi <= lo:
+            return
+        for start, end, phrase in self.matcher.finditer(buf, lo, hi):
+            if base + end > self._done:
+                self.on_span(base + start, base + end, phrase)
+        self._done = base + hi
+        self.pos = base + max(lo, hi - self.maxlen + 1)
+
+
+class StreamingRedactor:
+    def __init__(self, write, masks=None, types=None, scanner=SCANNER, overlap=DEFAULT_OVERLAP):
+        """
+        write: called with each redacted stretch of text, in order.
+        Output equals redact() on the whole text as long as no single match
+        is longer than overlap.
+        """
+        types = parse_types(types)
+        self.write = write
+        self.overlap = overlap
+        self._maskers = _maskers(masks, types)
+        self._heap = []
+        self._buf = ""
+        self._base = 0
+        self._pending = []
+        self._pending_len = 0
+        p = scanner.patterns
+        self._streams = [
+            _RegexStream(p[name], self._on_span(key), spans=True)
+            for key, name in SENSITIVE_KEYS if key in types
+        ]
+        self._windows = [_Window(list(self._streams), overlap)] if self._streams else []
+        self._low = None
+        phrase_types = [t for t in PHRASE_TYPES if t in types]
+        if phrase_types:
+            lexicon = {}
+            for kind, words in (("suspicious", scanner.suspicious_phrases), ("toxic", scanner.toxic_words)):
+                if kind in phrase_types:
+                    lexicon.update((w, kind) for w in words)
+            phrases = _PhraseSpanStream(scanner.matcher, lambda s, e, ph: self._add(s, e, lexicon.get(ph)))
+            self._streams.append(phrases)
+            self._low = _Window([phrases], overlap)
+
+    def _on_span(self, kind):
+        return lambda start, end, _: self._add(start, end, kind)
+
+    def _add(self, start, end, kind):
+        if kind is not None:
+            heapq.heappush(self._heap, (start, -end, RANK[kind], kind))
+
+    def feed(self, chunk: str):
+        self._pending.append(chunk)
+        self._pending_len += len(chunk)
+        # Scanning less than the overlap at a time would mostly re-read it.
+        if self._pending_len > self.overlap:
+            self._flush(final=False)
+
+    def _flush(self, final):
+        chunk = "".join(self._pending)
+        self._pending = []
+        self._pending_len = 0
+        self._buf += chunk
+        for window in self._windows:
+            window.feed(chunk, final)
+        if self._low is not None:
+            self._low.feed(lower_aligned(chunk), final)
+        self._emit(final)
+
+    def _emit(self, final):
+        # No match found later can start before every stream's position.
+        limit = self._base + len(self._buf)
+        safe = limit if final else min([s.pos for s in self._streams], default=limit)
+        heap, buf, base = self._heap, self._buf, self._base
+        parts = []
+        pos = base
+        cut = safe
+        while heap and heap[0][0] < safe:
+            start, end, rank, kind = heapq.heappop(heap)
+            end = -end
+            while heap and heap[0][0] < end:
+                end = max(end, -heapq.heappop(heap)[1])
+            if end > safe and not final:
+                # A later match might still overlap this one; wait for it.
+                heapq.heappush(heap, (start, -end, rank, kind))
+                cut = start
+                break
+            parts.append(buf[pos - base:start - base])
+            parts.append(self._maskers[kind](buf[start - base:end - base]))
+            pos = end
+        cut = max(cut, pos)
+        parts.append(buf[pos - base:cut - base])
+        self.write("".join(parts))
+        self._buf = buf[cut - base:]
+        self._base = cut
+
+    def finish(self):
+        self._flush(final=True)
+
+
+def redact_stream(chunks, write, masks=None, types=None, overlap=DEFAULT_OVERLAP):
+    r = StreamingRedactor(write, masks, types, overlap=overlap)
+    for chunk in chunks:
+        r.feed(chunk)
+    r.finish()
+
+
+def redact_file(src, dst, masks=None, types=None, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    """
+    Streams src into dst (paths) redacted.
+    """
+    with open(dst, "w", encoding="utf-8") as out:
+        redact_stream(iter_file(src, chunk_size), out.write, masks, types, overlap)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a document with PII masked.")
+    parser.add_argument("input", help="text file ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--types", help="comma list of " + ", ".join(LABELS) + " (default: the PII types)")
+    parser.add_argument("--mask", action="append", default=[],
+                        help="type=style, style one of label, x, partial, hash, remove or a literal; "
+                             "*=style sets the default")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    try:
+        types = parse_types(args.types)
+        masks = parse_masks(args.mask)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.input == "-":
+        chunks = iter(lambda: sys.stdin.read(args.chunk_size), "")
+    else:
+        chunks = iter_file(args.input, args.chunk_size)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        redact_stream(chunks, out.write, masks, types)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Compiled scan engine behind the detector.py feature extractors.
+
+A Scanner is built once from the detector tables: the compiled patterns
+and one phrase automaton over all three lexicons. Its methods are the
+individual extractors. Callers share the intermediates between them;
+pipeline.Analysis lowercases the document once and hands the lowered
+text to phrase_hits() and term_counts(), and stream/incremental feed the
+*_from_counts() methods with counts they gathered piece by piece.
+"""
+import re
+from collections import Counter
+
+from phrases import PhraseMatcher
+
+RE_DIGIT = re.compile(r"\d")
+
+# Report key -> pattern name, in report order.
+SENSITIVE_KEYS = (
+    ("emails", "email"),
+    ("phones", "phone"),
+    ("urls", "url"),
+    ("aadhar_like", "aadhaar"),
+    ("long_numbers", "numeric_long"),
+    ("ips", "ip"),
+)
+
+LONG_SENTENCE_WORDS = 30
+REPEATED_TERM_MIN = 5
+REPEATED_TERMS_MAX = 10
+
+
+def dedupe(items):
+    return list(dict.fromkeys(items))
+
+
+def lower_aligned(text: str):
+    """
+    text.lower(), except that the few characters whose lowercase form has
+    a different length are kept as they are, so offsets in the result are
+    offsets in text.
+    """
+    low = text.lower()
+    if len(low) == len(text):
+        return low
+    return "".join(c if len(lc) != 1 else lc for c, lc in zip(text, map(str.lower, text)))
+
+
+class Scanner:
+    def __init__(self, patterns, toxic_words, suspicious_phrases, common_templates,
+                 word_boundary=False):
+        """
+        patterns: dict with the compiled 'email', 'phone', 'aadhaar',
+        'numeric_long', 'ip', 'url', 'caps', 'term', 'word', 'token' and
+        'sentence_split' regexes.
+        word_boundary: match lexicon phrases on word boundaries only.
+        """
+        self.patterns = patterns
+        self.toxic_words = list(toxic_words)
+        self.suspicious_phrases = list(suspicious_phrases)
+        self.common_templates = list(common_templates)
+        # One automaton over all three lexicons, so a single pass over the
+        # lowered text finds toxic, suspicious and template hits together.
+        self.matcher = PhraseMatcher(
+            self.toxic_words + self.suspicious_phrases + self.common_templates,
+            word_boundary=word_boundary
+        )
+
+    def sensitive_matches(self, text: str):
+        """
+        Returns {report key: raw findall list} before de-duplication.
+        """
+        p = self.patterns
+        # Cheap C-level prefilters: every pattern below needs an '@', a URL
+        # prefix or a digit, so skip whole regex passes that cannot match.
+        has_digit = RE_DIGIT.search(text) is not None
+        has_url = "http" in text or "www." in text
+        possible = {"email": "@" in text, "url": has_url}
+        found = {}
+        for key, name in SENSITIVE_KEYS:
+            found[key] = p[name].findall(text) if possible.get(name, has_digit) else []
+        return found
+
+    def sensitive(self, text: str):
+        return {k: dedupe(v) for k, v in self.sensitive_matches(text).items()}
+
+    def sensitive_spans(self, text: str):
+        """
+        Returns {report key: [(start, end, match), ...]} for every
+        occurrence, in text order; the matches are those of
+        sensitive_matches().
+        """
+        p = self.patterns
+        has_digit = RE_DIGIT.search(text) is not None
+        has_url = "http" in text or "www." in text
+        possible = {"email": "@" in text, "url": has_url}
+        found = {}
+        for key, name in SENSITIVE_KEYS:
+            found[key] = ([(m.start(), m.end(), m.group()) for m in p[name].finditer(text)]
+                          if possible.get(name, has_digit) else [])
+        return found
+
+    def phrase_hits(self, low: str):
+        """
+        Returns {'toxic': [...], 'suspicious': [...], 'templates': [...]},
+        each list in its lexicon order.
+        """
+        return self.group_hits(self.matcher.hits(low))
+
+    def phrase_spans(self, text: str):
+        """
+        Returns {'toxic': [...], 'suspicious': [...], 'templates': [...]},
+        each a list of (start, end, phrase) for every occurrence in text
+        (original case; matching is on the lowercased text), ordered by end.
+        """
+        lexicons = (("toxic", set(self.toxic_words)), ("suspicious", set(self.suspicious_phrases)),
+                    ("templates", set(self.common_templates)))
+        spans = {name: [] for name, _ in lexicons}
+        for hit in self.matcher.finditer(lower_aligned(text)):
+            for name, words in lexicons:
+                if hit[2] in words:
+                    spans[name].append(hit)
+        return spans
+
+    def group_hits(self, found):
+        """
+        Splits a collection of matched phrases back into the three lexicons.
+        """
+        found = set(found)
+        return {
+            "toxic": [w for w in self.toxic_words if w in found],
+            "suspicious": [p for p in self.suspicious_phrases if p in found],
+            "templates": [t for t in self.common_templates if t in found],
+        }
+
+    def tone(self, text: str, phrase_hits):
+        exclam = text.count("!")
+        caps_words = len(self.patterns["caps"].findall(text))
+        questions = text.count("?")
+        return self.tone_from_counts(phrase_hits, exclam, caps_words, questions)
+
+    def tone_from_counts(self, phrase_hits, exclam, caps_words, questions):
+        toxic_hits = phrase_hits["toxic"]
+        suspicious_hits = phrase_hits["suspicious"]
+        tone = 50
+        tone -= len(toxic_hits) * 20
+        tone -= len(suspicious_hits) * 8
+        tone -= min(caps_words,5) * 3
+        tone -= min(exclam,5) * 2
+        tone += min(questions,3) * 1
+        tone = max(0, min(100, tone))
+        return {
+            "toxic_hits": toxic_hits,
+            "suspicious_hits": suspicious_hits,
+            "exclamations": exclam,
+            "caps_words": caps_words,
+            "questions": questions,
+            "tone_score": tone
+        }
+
+    def word_stats(self, text: str):
+        """
+        Returns (word_count, word_chars) from a single \\w+ tokenization.
+        """
+        words = self.patterns["word"].findall(text)
+        return len(words), sum(map(len, words))
+
+    def term_counts(self, low: str):
+        return Counter(self.patterns["term"].findall(low))
+
+    def sentences(self, text: str):
+        sentences = self.patterns["sentence_split"].split(text.strip())
+        return list(filter(str.strip, sentences))
+
+    def structure(self, sentences, word_count: int, word_chars: int):
+        lens = list(map(len, map(str.split, sentences)))
+        long_sentences = sum(1 for n in lens if n > LONG_SENTENCE_WORDS)
+        return self.structure_from_counts(len(lens), sum(lens), long_sentences, word_count, word_chars)
+
+    def structure_from_counts(self, num_sentences, sentence_words, long_sentences,
+                              word_count, word_chars):
+        avg_sentence_len = (sentence_words / num_sentences) if num_sentences else 0
+        avg_word_len = (word_chars / word_count) if word_count else 0
+        return {
+            "num_sentences": num_sentences,
+            "num_words": word_count,
+            "avg_sentence_len": round(avg_sentence_len,2),
+            "avg_word_len": round(avg_word_len,2),
+            "long_sentences_count": long_sentences
+        }
+
+    def plagiarism(self, phrase_hits, term_counts):
+        hits = phrase_hits["templates"]
+        repeated = [w for w,n in term_counts.items() if n>REPEATED_TERM_MIN][:REPEATED_TERMS_MAX]
+        return {"template_hits": hits, "repeated_terms": repeated}
@@ -0,0 +1,245 @@
+"""
+Streaming analysis for documents too large to hold in memory.
+
+The document is fed in chunks. Each detector keeps a small incremental
+state (a resume offset plus its running counts or deduplicated matches)
+and scans a sliding window made of the unconsumed tail of the previous
+chunk and the new one. A match is only accepted once enough text follows
+it to be sure it cannot grow, so items split across a chunk boundary are
+still found. Peak memory is O(chunk size + overlap) plus the distinct
+matches and terms collected.
+
+Results equal analyze() on the whole text as long as no single match is
+longer than the overlap. The LLM stage is not run on streamed input.
+"""
+from collections import Counter
+
+from detector import SCANNER, llm_enabled
+from pipeline import Analysis
+from scanner import SENSITIVE_KEYS, LONG_SENTENCE_WORDS
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_OVERLAP = 4096
+SENTENCE_END = ".!?"
+
+
+class SentenceStats:
+    """
+    Sentence counts from a stream of whitespace-separated tokens. A sentence
+    is a run of tokens closed by one ending in . ! or ?, which is exactly
+    what the split regex in Scanner.sentences() produces.
+    """
+    def __init__(self, ends=SENTENCE_END):
+        self.ends = ends
+        self.num_sentences = 0
+        self.sentence_words = 0
+        self.long_sentences = 0
+        self._cur = 0
+
+    def add_token(self, tok):
+        self._cur += 1
+        if tok[-1] in self.ends:
+            self.close()
+
+    def extend(self, n):
+        """
+        Adds n tokens to the open sentence without closing it.
+        """
+        self._cur += n
+
+    def add_closed(self, count, words, long_sentences):
+        """
+        Adds already-closed sentences, counted elsewhere.
+        """
+        self.num_sentences += count
+        self.sentence_words += words
+        self.long_sentences += long_sentences
+
+    def close(self):
+        n = self._cur
+        if n:
+            self.num_sentences += 1
+            self.sentence_words += n
+            if n > LONG_SENTENCE_WORDS:
+                self.long_sentences += 1
+            self._cur = 0
+
+
+class _RegexStream:
+    """
+    Incremental findall for one compiled pattern. pos is the absolute offset
+    where the next search starts.
+    """
+    def __init__(self, regex, on_match, spans=False):
+        """
+        spans: call on_match(start, end, match) with absolute offsets
+        instead of on_match(match).
+        """
+        self.regex = regex
+        self.on_match = on_match
+        self.spans = spans
+        self.pos = 0
+
+    def feed(self, buf, base, commit, final):
+        # buf holds absolute offsets [base, base + len(buf)). Matches that
+        # start at or past commit, or that run into the end of buf, may
+        # still change with more text and are left for the next window.
+        end = len(buf)
+        pos = self.pos - base
+        for m in self.regex.finditer(buf, pos):
+            if not final and (m.start() >= commit or m.end() >= end):
+                self.pos = base + m.start()
+                return
+            if self.spans:
+                self.on_match(base + m.start(), base + m.end(), m.group())
+            else:
+                self.on_match(m.group())
+            pos = m.end()
+        self.pos = base + (end if final else max(pos, commit))
+
+
+class _PhraseStream:
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.maxlen = max((len(p) for p in matcher.phrases), default=1)
+        self.found = set()
+        self.pos = 0
+
+    def feed(self, buf, base, commit, final):
+        # Hold back one character so word-boundary checks see the next one.
+        lo = self.pos - base
+        hi = len(buf) if final else len(buf) - 1
+        if hi <= lo:
+            return
+        self.found.update(self.matcher.hits(buf, lo, hi))
+        self.pos = base + max(lo, hi - self.maxlen + 1)
+
+
+class _Window:
+    """
+    Sliding buffer shared by the streams that scan one version of the text
+    (original or lowercased).
+    """
+    def __init__(self, streams, overlap):
+        self.streams = streams
+        self.overlap = overlap
+        self.buf = ""
+        self.base = 0
+
+    def feed(self, chunk, final=False):
+        buf = self.buf + chunk if self.buf else chunk
+        commit = len(buf) - self.overlap
+        for s in self.streams:
+            s.feed(buf, self.base, commit, final)
+        if final:
+            self.buf = ""
+            return
+        # Keep one character of left context for lookbehinds and \b.
+        keep = min(s.pos for s in self.streams) - self.base - 1
+        keep = max(0, min(keep, len(buf)))
+        self.buf = buf[keep:]
+        self.base += keep
+
+
+class StreamingAnalyzer:
+    def __init__(self, scanner=SCANNER, overlap=DEFAULT_OVERLAP):
+        """
+        overlap: how much of a chunk's tail is re-examined with the next
+        chunk; must exceed the longest match that should survive a split.
+        """
+        self.scanner = scanner
+        self.overlap = overlap
+        p = scanner.patterns
+        self.sensitive = {key: {} for key, _ in SENSITIVE_KEYS}
+        self.exclam = 0
+        self.questions = 0
+        self.caps_words = 0
+        self.word_count = 0
+        self.word_chars = 0
+        self.term_counts = Counter()
+        self.sentences = SentenceStats()
+        self._phrases = _PhraseStream(scanner.matcher)
+        self._pending = []
+        self._pending_len = 0
+        text_streams = [
+            _RegexStream(p[name], self.sensitive[key].setdefault)
+            for key, name in SENSITIVE_KEYS
+        ]
+        text_streams += [
+            _RegexStream(p["caps"], self._on_caps),
+            _RegexStream(p["word"], self._on_word),
+            _RegexStream(p["token"], self.sentences.add_token),
+        ]
+        self._text = _Window(text_streams, overlap)
+        self._low = _Window([_RegexStream(p["term"], self._on_term), self._phrases], overlap)
+
+    def _on_caps(self, _):
+        self.caps_words += 1
+
+    def _on_word(self, w):
+        self.word_count += 1
+        self.word_chars += len(w)
+
+    def _on_term(self, t):
+        self.term_counts[t] += 1
+
+    def feed(self, chunk: str):
+        self.exclam += chunk.count("!")
+        self.questions += chunk.count("?")
+        self._pending.append(chunk)
+        self._pending_len += len(chunk)
+        # Scanning less than the overlap at a time would mostly re-read it.
+        if self._pending_len > self.overlap:
+            self._flush(final=False)
+
+    def _flush(self, final):
+        chunk = "".join(self._pending)
+        self._pending = []
+        self._pending_len = 0
+        self._text.feed(chunk, final)
+        self._low.feed(chunk.lower(), final)
+
+    def finish(self):
+        """
+        Flushes the remaining text and returns the report. The LLM section
+        carries the heuristic fallback when no LLM is configured, else None.
+        """
+        self._flush(final=True)
+        self.sentences.close()
+        sc = self.scanner
+        st = self.sentences
+        phrase_hits = sc.group_hits(self._phrases.found)
+        a = Analysis.from_sections(
+            sc,
+            sensitive={k: list(v) for k, v in self.sensitive.items()},
+            tone=sc.tone_from_counts(phrase_hits, self.exclam, self.caps_words, self.questions),
+            structure=sc.structure_from_counts(
+                st.num_sentences, st.sentence_words, st.long_sentences,
+                self.word_count, self.word_chars
+            ),
+            plagiarism=sc.plagiarism(phrase_hits, self.term_counts),
+        )
+        return a.report(None if llm_enabled() else a.fallback)
+
+
+def analyze_stream(chunks, overlap=DEFAULT_OVERLAP):
+    """
+    Analyzes a document given as an iterable of text chunks.
+    """
+    sa = StreamingAnalyzer(overlap=overlap)
+    for chunk in chunks:
+        sa.feed(chunk)
+    return sa.finish()
+
+
+def iter_file(path, chunk_size=DEFAULT_CHUNK_SIZE, encoding="utf-8"):
+    with open(path, encoding=encoding, errors="replace") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def analyze_file(path, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    return analyze_stream(iter_file(path, chunk_size), overlap)
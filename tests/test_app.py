@@ -0,0 +1,58 @@
+import os
+import pstats
+import sys
+
+import pytest
+
+import app as webapp
+
+
+@pytest.fixture
+def profiled(monkeypatch, tmp_path):
+    """
+    Profiles every request and keeps every dump, in tmp_path.
+    """
+    monkeypatch.setattr(webapp, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(webapp, "PROFILE_THRESHOLD", 0)
+    return tmp_path
+
+
+def dumps(path):
+    return [os.path.join(path, name) for name in os.listdir(path)]
+
+
+def test_profiler_stops_when_view_raises(profiled, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(webapp, "_heuristic_report", broken)
+    # As in debug mode, the error reaches the server and after_request never runs.
+    monkeypatch.setitem(webapp.app.config, "PROPAGATE_EXCEPTIONS", True)
+    with pytest.raises(RuntimeError):
+        webapp.app.test_client().post("/analyze", data={"doc_text": "hello"})
+    assert sys.getprofile() is None
+    assert [os.path.basename(p).split("-")[0] for p in dumps(profiled)] == ["run_analyze"]
+
+
+def test_streamed_page_profiled_to_the_end(profiled, monkeypatch):
+    monkeypatch.setattr(webapp, "STREAM_MIN_CHARS", 10)
+    response = webapp.app.test_client().post("/analyze", data={"doc_text": "hello a@b.com " * 10})
+    assert response.status_code == 200
+    assert b"a@b.com" in response.get_data()
+    response.close()
+    assert sys.getprofile() is None
+    [dump] = dumps(profiled)
+    # The analysis runs while the page is sent, so it is in the profile.
+    assert any(func == "_heuristic_report" for _, _, func in pstats.Stats(dump).stats)
+
+
+@pytest.mark.parametrize("triage, threshold", [(50, 50), ("50", 50), ("high", 61), ("HIGH", 61)])
+def test_triage_thresholds(triage, threshold):
+    reply = webapp.app.test_client().post("/api/v1/analyze", json={"text": "hi", "triage": triage})
+    assert reply.get_json()["triage"]["threshold"] == threshold
+
+
+@pytest.mark.parametrize("triage", [50.7, True, False, "5.5", "-1", "²", [], "abc"])
+def test_triage_rejects_non_integers(triage):
+    reply = webapp.app.test_client().post("/api/v1/analyze", json={"text": "hi", "triage": triage})
+    assert reply.status_code == 400
@@ -0,0 +1,16 @@
+import json
+
+from batch import iter_source
+
+
+def test_jsonl_skips_non_string_text(tmp_path, capsys):
+    path = tmp_path / "docs.jsonl"
+    lines = [{"id": "a", "text": "mail a@b.com"}, {"id": "b", "text": 42}, None,
+             {"id": "c", "text": ["x"]}, [1, 2], {"id": "d"}, {"id": "e", "text": None}]
+    path.write_text("\n".join("" if obj is None else json.dumps(obj) for obj in lines), encoding="utf-8")
+    assert list(iter_source(str(path))) == [("a", "mail a@b.com", None), ("d", "", None), ("e", "", None)]
+    assert capsys.readouterr().err.splitlines() == [
+        f"{path}:2: skipped, 'text' is not a string",
+        f"{path}:4: skipped, 'text' is not a string",
+        f"{path}:5: skipped, not a JSON object",
+    ]
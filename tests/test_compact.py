@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import detector
+from compact import CompactReport, pack
+
+SUBSETS = [None, "pii", "tone,structure", "plagiarism,pii", "structure"]
+
+
+@pytest.fixture(autouse=True)
+def no_llm(monkeypatch):
+    monkeypatch.setattr(detector, "LLM_CLIENT", None)
+
+
+def round_trip(report):
+    decoded = CompactReport(pack(report)).to_dict()
+    assert decoded == report
+    assert list(decoded) == list(report)
+
+
+def test_reports_round_trip(documents):
+    for doc in documents:
+        for detectors in SUBSETS:
+            round_trip(detector.analyze(doc, cache=False, detectors=detectors))
+        round_trip(detector.analyze(doc, cache=False, triage=True))
+
+
+def test_odd_values_round_trip(documents):
+    rng = random.Random(23)
+    for doc in documents:
+        report = detector.analyze(doc, cache=False)
+        change = rng.randrange(7)
+        if change == 0:
+            report["llm"] = {"summary": "checked", "issues": ["é", "😀"]}
+        elif change == 1:
+            report["sensitive"]["emails"] = ["u%d@example.com" % i for i in range(rng.randrange(250, 400))]
+        elif change == 2:
+            report["plagiarism_hint"]["repeated_terms"] = ["naïve", "nul\0byte", "", "😀"]
+        elif change == 3:
+            report["tone"]["tone_score"] = 1.5
+        elif change == 4:
+            del report["evidence"]
+        elif change == 5:
+            # Sections come before llm, as in Analysis.report().
+            llm = report.pop("llm")
+            report["similar_documents"] = [{"id": "doc-%d" % i, "jaccard": rng.random()}
+                                           for i in range(rng.randrange(4))]
+            report["llm"] = llm
+        else:
+            report["risk_level"] = "Custom"
+        round_trip(report)
+
+
+def test_score_must_fit():
+    report = detector.analyze("hello", cache=False)
+    report["score"] = 256
+    with pytest.raises(ValueError):
+        pack(report)
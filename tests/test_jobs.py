@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+import pytest
+
+import app as webapp
+import detector
+from jobs import JobQueueFull, JobStore
+from llm import LLMClient
+
+TEXT = "Please send the invoice to a@b.com before Friday. This is URGENT! Ref {}"
+
+
+@pytest.fixture
+def client(monkeypatch, mock_llm):
+    """
+    Test client whose LLM backend is llm_mock, through the real client.
+    Each test sends its own text, so LLM_CACHE never answers for the mock.
+    """
+    server = mock_llm(latency=0.05)
+    monkeypatch.setattr(detector, "LLM_CLIENT", LLMClient(base_url=server.url, max_retries=0))
+    monkeypatch.setattr(detector, "LLM_BATCHER", None)
+    monkeypatch.setitem(webapp.app.config, "LLM_BACKEND", detector.llm_analyze_openai)
+    return webapp.app.test_client()
+
+
+def poll(client, url, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(url).get_json()
+        if job["status"] != "pending" or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_result_page_job(client):
+    page = client.post("/analyze", data={"doc_text": TEXT.format(uuid.uuid4().hex)})
+    assert page.status_code == 200
+    url = re.search(rb"/jobs/[0-9a-f]{32}", page.data).group().decode()
+    job = poll(client, url)
+    assert job["status"] == "done"
+    assert job["result"]["summary"].startswith("Mock analysis")
+
+
+def test_api_async_job(client):
+    body = {"text": TEXT.format(uuid.uuid4().hex), "llm": "async"}
+    reply = client.post("/api/v1/analyze", json=body).get_json()
+    assert reply["llm"] is None
+    job = poll(client, reply["job"]["url"])
+    assert job["status"] == "done"
+    assert job["result"]["advice"] == ["This answer came from llm_mock.py."]
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/" + "0" * 32).status_code == 404
+
+
+def test_failed_job():
+    jobs = JobStore(max_workers=1)
+
+    def fail():
+        raise RuntimeError("backend down")
+
+    job_id = jobs.submit(fail)
+    jobs.shutdown()
+    assert jobs.get(job_id) == {
+        "id": job_id, "status": "error", "result": {"error": "LLM call failed: backend down"},
+    }
+
+
+def test_queue_full():
+    jobs = JobStore(max_workers=1, max_pending=1)
+    release = threading.Event()
+    job_id = jobs.submit(release.wait)
+    with pytest.raises(JobQueueFull):
+        jobs.submit(release.wait)
+    release.set()
+    while jobs.get(job_id)["status"] == "pending":
+        time.sleep(0.01)
+    jobs.submit(lambda: None)
+    jobs.shutdown()
+
+
+def test_jobs_shared_through_sqlite(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    owner, sibling = JobStore(path=path), JobStore(path=path)
+    job_id = owner.submit(lambda: {"summary": "ok"})
+    owner.shutdown()
+    assert sibling.get(job_id) == {"id": job_id, "status": "done", "result": {"summary": "ok"}}
+    assert os.stat(path).st_mode & 0o777 == 0o600
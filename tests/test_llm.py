@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+import detector
+import llm_mock
+from llm import LLMClient, LLMError, LLMTimeout, MicroBatcher, TokenBucket
+
+MESSAGES = [{"role": "user", "content": "Document:\n'''hello'''"}]
+
+
+def test_retries_5xx(mock_llm):
+    server = mock_llm(fail_rate=0.5, seed=3)
+    client = LLMClient(base_url=server.url, max_retries=20, backoff=0.001)
+    for _ in range(5):
+        assert "Mock analysis" in client.chat(MESSAGES)
+    assert server.stats["failures"] > 0
+    assert server.stats["requests"] == server.stats["failures"] + 5
+
+
+def test_gives_up_after_max_retries(mock_llm):
+    server = mock_llm(fail_rate=1.0)
+    client = LLMClient(base_url=server.url, max_retries=2, backoff=0.001)
+    with pytest.raises(LLMError, match="giving up after 3 attempts: HTTP 503"):
+        client.chat(MESSAGES)
+    assert server.stats["requests"] == 3
+
+
+def test_no_retry_on_4xx(mock_llm):
+    server = mock_llm()
+    client = LLMClient(base_url=server.url, max_retries=5)
+    with pytest.raises(LLMError, match="HTTP 404"):
+        client.post("/missing", {})
+    assert server.stats["connections"] == 1
+
+
+def test_retries_429(mock_llm):
+    server = mock_llm(latency=0.1, rate_limit=1)
+    client = LLMClient(base_url=server.url, max_concurrency=2, max_retries=20, backoff=0.01)
+    replies = []
+
+    def call():
+        replies.append(client.chat(MESSAGES))
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(replies) == 2
+    assert server.stats["rate_limited"] > 0
+
+
+def test_deadline(mock_llm):
+    server = mock_llm(fail_rate=1.0)
+    client = LLMClient(base_url=server.url, deadline=0.3, max_retries=1000, backoff=0.05)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        client.chat(MESSAGES)
+    assert time.monotonic() - started < 0.5
+
+
+def test_slow_backend_hits_deadline(mock_llm):
+    server = mock_llm(latency=1.0)
+    client = LLMClient(base_url=server.url, deadline=0.2, max_retries=1000)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        client.chat(MESSAGES)
+    assert time.monotonic() - started < 0.5
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first token is in the bucket; the other five come at 50/s.
+    assert time.monotonic() - started >= 0.09
+    with pytest.raises(LLMTimeout):
+        bucket.acquire(deadline=time.monotonic() + 0.001)
+    unlimited = TokenBucket(rate=0)
+    for _ in range(1000):
+        unlimited.acquire(deadline=time.monotonic())
+
+
+def test_micro_batcher_groups_items():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+
+    batcher = MicroBatcher(double, max_batch=4, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(6)]
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6, 8, 10]
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_micro_batcher_short_result():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch=2, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(2)]
+    for f in futures:
+        with pytest.raises(LLMError, match="1 results for 2 items"):
+            f.result(timeout=5)
+
+
+@pytest.fixture
+def mock_client(monkeypatch, mock_llm):
+    server = mock_llm()
+    monkeypatch.setattr(detector, "LLM_CLIENT", LLMClient(base_url=server.url))
+    return server
+
+
+def test_batch_request(mock_client):
+    batcher = MicroBatcher(detector._openai_request_batch, max_batch=3, max_wait=0.2)
+    futures = [batcher.submit(t) for t in ("one", "two", "three")]
+    assert all("Mock analysis" in f.result(timeout=5)["summary"] for f in futures)
+    assert mock_client.stats["requests"] == 1
+    assert mock_client.stats["documents"] == 3
+
+
+def test_batch_falls_back_to_single_calls(mock_client, monkeypatch):
+    # A backend that ignores the document sections answers the batch
+    # with a single result, so each document is sent on its own.
+    monkeypatch.setattr(llm_mock, "RE_DOC", llm_mock.re.compile(r"(?!)()"))
+    results = detector._openai_request_batch(["one", "two", "three"])
+    assert all("Mock analysis" in r["summary"] for r in results)
+    assert mock_client.stats["requests"] == 4
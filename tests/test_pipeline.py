@@ -0,0 +1,40 @@
+from collections import Counter
+
+import pytest
+
+import detector
+
+# Scanner methods behind the detector extractors and their shared stages.
+EXTRACTORS = ("sensitive_matches", "phrase_hits", "term_counts", "word_stats", "sentences",
+              "tone", "structure", "plagiarism")
+
+TEXT = (
+    "Contact me at a@b.com or +91 9876543210. This is URGENT, please send money via the bank! "
+    "In conclusion, the results show that the plan works. Why was it late?"
+)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    Counts calls to each extractor on detector.SCANNER, with no LLM
+    configured.
+    """
+    monkeypatch.setattr(detector, "LLM_CLIENT", None)
+    counts = Counter()
+    for name in EXTRACTORS:
+        method = getattr(detector.SCANNER, name)
+
+        def counted(*args, _name=name, _method=method):
+            counts[_name] += 1
+            return _method(*args)
+
+        monkeypatch.setattr(detector.SCANNER, name, counted)
+    return counts
+
+
+def test_extractors_run_once_per_document(calls):
+    report = detector.analyze(TEXT, cache=False)
+    assert report["llm"] is not None
+    assert calls == Counter({name: 1 for name in EXTRACTORS})
+
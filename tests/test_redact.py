@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from detector import SCANNER
+from redact import LABELS, PII_TYPES, redact, redact_stream, spans
+
+ALL_TYPES = list(LABELS)
+MASKS = ["label", "x", "partial", "hash", "remove", "*=[gone],emails=partial,toxic=x"]
+
+
+def covered(ranges):
+    return {i for start, end in ranges for i in range(start, end)}
+
+
+def test_spans_cover_every_match(documents):
+    for doc in documents:
+        found = spans(doc, ALL_TYPES)
+        assert all(0 <= start < end <= len(doc) for start, end, _ in found)
+        assert all(a[1] <= b[0] for a, b in zip(found, found[1:]))
+        raw = [(s, e) for hits in SCANNER.sensitive_spans(doc).values() for s, e, _ in hits]
+        phrases = SCANNER.phrase_spans(doc)
+        raw += [(s, e) for kind in ("toxic", "suspicious") for s, e, _ in phrases[kind]]
+        assert covered((s, e) for s, e, _ in found) == covered(raw)
+
+
+def test_pii_spans_match_findings(documents):
+    for doc in documents:
+        found = spans(doc)
+        values = [doc[s:e] for s, e, _ in found]
+        for items in SCANNER.sensitive(doc).values():
+            assert all(any(v in value for value in values) for v in items)
+        assert all(kind in PII_TYPES for _, _, kind in found)
+
+
+def test_redact_joins_masked_spans(documents):
+    for doc in documents:
+        kept = []
+        pos = 0
+        for start, end, _ in spans(doc, ALL_TYPES):
+            kept.append(doc[pos:start])
+            pos = end
+        kept.append(doc[pos:])
+        assert redact(doc, "*=remove", ALL_TYPES) == "".join(kept)
+
+
+@pytest.mark.parametrize("masks", MASKS)
+def test_stream_matches_one_pass(documents, masks):
+    if "=" not in masks:
+        masks = "*=" + masks
+    rng = random.Random(masks)
+    for doc in documents:
+        cuts = sorted(rng.randrange(len(doc) + 1) for _ in range(rng.randrange(1, 40)))
+        chunks = [doc[a:b] for a, b in zip([0] + cuts, cuts + [len(doc)])]
+        out = []
+        redact_stream(chunks, out.append, masks, ALL_TYPES, overlap=64)
+        assert "".join(out) == redact(doc, masks, ALL_TYPES)
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+import detector
+from stream import analyze_file, analyze_stream
+
+
+@pytest.fixture(autouse=True)
+def no_llm(monkeypatch):
+    monkeypatch.setattr(detector, "LLM_CLIENT", None)
+
+
+def random_chunks(rng, text, max_size):
+    cuts = sorted(rng.randrange(len(text) + 1) for _ in range(len(text) // max_size + 1))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("max_size", [1, 7, 100, 5000])
+def test_windows_match_whole_text(documents, max_size):
+    rng = random.Random(max_size)
+    for doc in documents:
+        chunks = random_chunks(rng, doc, max_size)
+        assert "".join(chunks) == doc
+        assert analyze_stream(chunks, overlap=64) == detector.analyze(doc, cache=False)
+
+
+def test_file_matches_whole_text(documents, tmp_path):
+    path = tmp_path / "doc.txt"
+    doc = "\n\n".join(documents)
+    path.write_text(doc, encoding="utf-8")
+    assert analyze_file(str(path), chunk_size=333, overlap=64) == detector.analyze(doc, cache=False)
@@ -0,0 +1,32 @@
+import pytest
+
+import detector
+from pipeline import SCORE_CAPS, score_from
+
+THRESHOLDS = [0, 1, 10, 20, 31, 45, 61, 80, 100, 101]
+
+
+@pytest.fixture(autouse=True)
+def no_llm(monkeypatch):
+    monkeypatch.setattr(detector, "LLM_CLIENT", None)
+
+
+def test_sections_stay_under_their_caps(documents):
+    for doc in documents:
+        report = detector.analyze(doc, cache=False)
+        for section, cap in SCORE_CAPS.items():
+            assert score_from({section: report[section]}) <= cap
+
+
+@pytest.mark.parametrize("threshold", THRESHOLDS)
+def test_triage_outcome_matches_full_run(documents, threshold):
+    for doc in documents:
+        full = detector.analyze(doc, cache=False)["score"]
+        report = detector.analyze(doc, cache=False, triage=threshold)
+        triage = report["triage"]
+        assert triage["above"] == (full >= threshold)
+        assert report["score"] <= full
+        if triage["early_exit"]:
+            assert (report["score"] >= threshold) == triage["above"]
+        else:
+            assert report["score"] == full
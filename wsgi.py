@@ -0,0 +1,42 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py sets preload_app, so this module is imported once in the
+master before the workers fork. warm() runs one analysis with every
+default detector and loads the near-duplicate code, so compiled regexes,
+the phrase automaton and lazily imported detector targets are built there. gc.freeze() then moves all those objects
+out of the collector's reach, so GC passes in the workers do not touch
+(and copy) the shared pages.
+"""
+import gc
+
+from app import app, JOBS
+from detector import analyze
+
+WARMUP_TEXT = (
+    "Dear team, please review the attached draft. Contact me at warm.up@example.com or "
+    "+91 98765 43210, see https://example.com/draft. This is URGENT! Why was it late?"
+)
+
+
+def warm():
+    # Running "similar" would add the warm-up text to the near-duplicate
+    # index; hashing it is enough to load that detector's code.
+    analyze(WARMUP_TEXT, llm=False, cache=False)
+    import neardup
+    neardup.INDEX.hasher.signature(WARMUP_TEXT)
+
+
+def shutdown():
+    """
+    Lets LLM jobs already running finish before the worker exits.
+    """
+    JOBS.shutdown(wait=True)
+
+
+warm()
+gc.freeze()
+
+application = app